@@ -37,12 +37,14 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django_extensions",
     "rest_framework",
     "episodes",
 ]
 
 MIDDLEWARE = [
+    "episodes.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -50,6 +52,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "episodes.middleware.CorpusCacheMiddleware",
 ]
 
 ROOT_URLCONF = "critrole.urls"
@@ -89,6 +92,33 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# The file-based cache is shared by every process on the machine. Use
+# "django.core.cache.backends.locmem.LocMemCache" for a per-process one.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache",
+        "TIMEOUT": 24 * 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# API responses are cached until the corpus changes (see episodes.middleware).
+# Processes check for changes every CORPUS_STATE_TIMEOUT seconds.
+CORPUS_CACHE_PATH_PREFIX = "/api/"
+CORPUS_STATE_TIMEOUT = 10
+
+
+# Request instrumentation (see episodes.instrumentation): Server-Timing
+# headers, histograms at /api/instrumentation/ and a warning logged for
+# requests slower than SLOW_REQUEST_THRESHOLD milliseconds.
+INSTRUMENT_REQUESTS = False
+SLOW_REQUEST_THRESHOLD = 500
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -126,3 +156,27 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = "/static/"
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "episodes.pagination.KeysetPagination",
+    "PAGE_SIZE": 100,
+    "DEFAULT_RENDERER_CLASSES": [
+        "episodes.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# Largest page a client can ask for with ?page_size=
+MAX_PAGE_SIZE = 1000
+
+# Episodes whose caption timings are kept in memory for /api/episode/{id}/at/,
+# and how many seconds before they're reloaded. 0 queries the database instead.
+TIMELINE_CACHE_SIZE = 64
+TIMELINE_CACHE_TIMEOUT = 300
+
+# Written by ./manage.py build_similarity_index, read by /api/caption/{id}/similar/
+SIMILARITY_INDEX_PATH = BASE_DIR / "similarity.npz"
@@ -1,4 +1,10 @@
-from episodes.views import CaptionViewSet, CastMemberViewSet, EpisodeViewSet
+from episodes.views import (
+    CaptionViewSet,
+    CastMemberViewSet,
+    EpisodeViewSet,
+    InstrumentationView,
+    PhraseViewSet,
+)
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
@@ -7,8 +13,10 @@ router = routers.DefaultRouter()
 router.register(r'episode', EpisodeViewSet)
 router.register(r'castmember', CastMemberViewSet)
 router.register(r'caption', CaptionViewSet)
+router.register(r'phrase', PhraseViewSet, basename='phrase')
 
 urlpatterns = [
+    path('api/instrumentation/', InstrumentationView.as_view()),
     path('api/', include(router.urls)),
     path('admin/', admin.site.urls),
 ]
@@ -1,3 +1,179 @@
+import json
+
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from episodes.models import (
+    SEARCH_CONFIG,
+    Caption,
+    CastMember,
+    CastMemberAlias,
+    CorpusState,
+    Episode,
+)
+from episodes.sections import SECTIONS
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counting every caption takes longer than showing a page of them.
+    Large result sets are counted with the planner's estimate instead,
+    which is enough to page through them.
+    """
+
+    # Result sets estimated below this are counted exactly
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.exact_count_limit:
+            return super().count
+        return estimate
+
+
+def estimate_count(queryset):
+    """
+    The number of rows Postgres expects `queryset` to return: the
+    table's row count from its statistics when it isn't filtered, or
+    the query plan's estimate. None on other databases.
+    """
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            return row[0] if row and row[0] >= 0 else None
+
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]["Plan Rows"]
+
+
+class SectionListFilter(admin.SimpleListFilter):
+    """
+    Lists the known sections rather than asking the database for every
+    distinct value.
+    """
+
+    title = "section"
+    parameter_name = "section"
+    none_value = "none"
+
+    def lookups(self, request, model_admin):
+        return [(section, section) for section in SECTIONS] + [
+            (self.none_value, "No section")
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == self.none_value:
+            return queryset.filter(section__isnull=True)
+        if self.value() in SECTIONS:
+            return queryset.filter(section=self.value())
+        return queryset
+
+
+class CorpusAdmin(admin.ModelAdmin):
+    """
+    Edits invalidate the cached API responses. Speaker stats and phrase
+    counts are rebuilt by the next import or `detect_sections` run.
+    """
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        CorpusState.bump()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        CorpusState.bump()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        CorpusState.bump()
+
+
+@admin.register(Episode)
+class EpisodeAdmin(CorpusAdmin):
+    list_display = ("chapter", "title", "video_id")
+    ordering = ("chapter",)
+    search_fields = ("title",)
+    readonly_fields = ("subtitle_hash", "subtitle_mtime", "subtitle_size")
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term.strip().isdigit():
+            return queryset.filter(chapter=search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class CastMemberAliasInline(admin.TabularInline):
+    model = CastMemberAlias
+    extra = 0
+
+
+@admin.register(CastMember)
+class CastMemberAdmin(CorpusAdmin):
+    list_display = ("name", "id")
+    ordering = ("name",)
+    search_fields = ("name",)
+    inlines = (CastMemberAliasInline,)
+
+
+@admin.register(Caption)
+class CaptionAdmin(CorpusAdmin):
+    list_display = (
+        "id",
+        "episode",
+        "sequence",
+        "start_ts",
+        "section",
+        "speaker_names",
+        "text",
+    )
+    list_display_links = ("id",)
+    list_select_related = ("episode",)
+    list_filter = (SectionListFilter, "episode")
+    list_per_page = 100
+    # Walks the (episode, start_ms, id) index
+    ordering = ("episode", "start_ms", "id")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ("episode", "speakers")
+    fields = ("episode", "sequence", "start_ms", "end_ms", "section", "speakers", "text")
+    # Searches the full-text index, see `get_search_results`
+    search_fields = ("text",)
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .defer("normalized_text", "search_vector")
+            .prefetch_related("speakers")
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Matches captions with `search_vector` like the API's websearch
+        mode, instead of scanning every caption with LIKE.
+        """
+        if not search_term.strip():
+            return queryset, False
+
+        search_query = SearchQuery(
+            search_term, config=SEARCH_CONFIG, search_type="websearch"
+        )
+        return queryset.filter(search_vector=search_query), False
 
-# Register your models here.
+    @admin.display(description="speakers")
+    def speaker_names(self, caption):
+        return ", ".join(speaker.name for speaker in caption.speakers.all())
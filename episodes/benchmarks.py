@@ -0,0 +1,268 @@
+"""
+Benchmarks for the import, query and serialization hot paths, run by
+`./manage.py benchmark`. Every benchmark returns a flat dictionary of
+metrics; names say which way is better:
+
+    *_seconds, *_ms, *_queries   lower is better
+    *_per_second                 higher is better
+
+Anything else (sizes, counts) is informational and never compared.
+"""
+import contextlib
+import io
+import os
+import statistics
+import time
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from episodes.cast import CastResolver
+from episodes.loaders import get_loader
+from episodes.management.commands.import_subtitles import (
+    Command as ImportSubtitles,
+    TITLE_PATTERN,
+    parse_episode,
+    parse_episode_subtitles,
+)
+from episodes.models import Caption, Episode
+from episodes.serializers import CaptionSerializer, caption_row_data, caption_rows
+
+LOWER_IS_BETTER = ("_seconds", "_ms", "_queries")
+HIGHER_IS_BETTER = ("_per_second",)
+
+
+def synthetic_corpus(source, destination, scale=1, limit=None):
+    """
+    Fills `destination` with `scale` copies of the first `limit` (or
+    every) subtitle files in `source`, each copy renamed to a new chapter
+    (chapter + 1000 * copy) and video id. Files are symlinked, so 100x
+    costs no disk space. Returns the number of files.
+    """
+    os.makedirs(destination, exist_ok=True)
+    count = 0
+
+    for episode in parse_episode_subtitles(source)[:limit]:
+        filename = episode["filename"]
+        match = TITLE_PATTERN.match(filename)
+
+        for copy in range(scale):
+            chapter = int(match["chapter"]) + 1000 * copy
+            video_id = match["video_id"] if copy == 0 else f'{match["video_id"]}-{copy}'
+            name = (
+                f'{match["title"]}{match["campaign"]}Episode {chapter}-{video_id}.en.vtt'
+            )
+            target = os.path.join(destination, name)
+            if not os.path.lexists(target):
+                os.symlink(os.path.abspath(os.path.join(source, filename)), target)
+            count += 1
+
+    return count
+
+
+def timed(function, repeat=1):
+    """
+    Runs `function` `repeat` times, returns the durations in seconds and
+    the last result.
+    """
+    durations = []
+    result = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+
+    return durations, result
+
+
+def latency_metrics(prefix, durations):
+    durations = sorted(durations)
+    return {
+        f"{prefix}_median_ms": statistics.median(durations) * 1000,
+        f"{prefix}_p95_ms": durations[int(0.95 * (len(durations) - 1))] * 1000,
+    }
+
+
+def benchmark_vtt_parse(directory):
+    """
+    Parse throughput over every subtitle file in `directory`, without
+    touching the database.
+    """
+    directory = os.path.abspath(directory)
+    episodes = parse_episode_subtitles(directory)
+    size = sum(
+        os.path.getsize(os.path.join(directory, episode["filename"]))
+        for episode in episodes
+    )
+
+    durations, parsed = timed(
+        lambda: [len(parse_episode(directory, episode)["captions"]) for episode in episodes]
+    )
+    seconds = durations[0]
+
+    return {
+        "files": len(episodes),
+        "captions": sum(parsed),
+        "parse_seconds": seconds,
+        "parse_captions_per_second": sum(parsed) / seconds,
+        "parse_megabytes_per_second": size / 1e6 / seconds,
+    }
+
+
+def quiet_command(*args, **kwargs):
+    # The importer reports progress with print()
+    with contextlib.redirect_stdout(io.StringIO()):
+        call_command(*args, **kwargs)
+
+
+def benchmark_import(directory, loader="bulk", workers=1):
+    """
+    A full import of `directory`, then re-importing a single episode.
+    Needs a database, see `disposable_database`.
+    """
+    directory = os.path.abspath(directory)
+    durations, _ = timed(
+        lambda: quiet_command(
+            "import_subtitles",
+            path=directory,
+            force=True,
+            loader=loader,
+            workers=workers,
+        )
+    )
+    captions = Caption.objects.count()
+
+    episode = Episode.objects.order_by("chapter").first()
+    command = ImportSubtitles()
+    command.loader = get_loader(loader)
+    command.cast = CastResolver()
+    command.section_overrides = Caption.load_section_overrides()
+    parsed = parse_episode(
+        directory,
+        {
+            "chapter": str(episode.chapter),
+            "title": episode.title,
+            "video_id": episode.video_id,
+            "filename": episode.subtitle_filename,
+        },
+    )
+    parsed.update(
+        subtitle_hash=episode.subtitle_hash,
+        subtitle_mtime=episode.subtitle_mtime,
+        subtitle_size=episode.subtitle_size,
+    )
+    single_durations, _ = timed(lambda: command.save_episode(parsed, episode), repeat=3)
+
+    return {
+        "episodes": Episode.objects.count(),
+        "captions": captions,
+        "import_seconds": durations[0],
+        "import_captions_per_second": captions / durations[0],
+        "single_episode_import_seconds": min(single_durations),
+    }
+
+
+def benchmark_requests(repeat=20):
+    """
+    Latency and query counts for the caption endpoints, with response
+    caching turned off so every request reaches the view.
+    """
+    caption = Caption.objects.order_by("episode__chapter", "sequence")[500]
+    endpoints = {
+        "caption_list": "/api/caption/?page_size=100",
+        "caption_list_large": "/api/caption/?page_size=1000",
+        "caption_detail": f"/api/caption/{caption.id}/",
+        "caption_context": f"/api/caption/{caption.id}/context/?before=10&after=10",
+        "caption_search": "/api/caption/search/?q=thursday",
+        "episode_at": f"/api/episode/{caption.episode_id}/at/?t=600",
+    }
+    client = Client()
+    results = {}
+
+    with override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    ):
+        for name, url in endpoints.items():
+            # Warm up, and count queries once
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url, HTTP_ACCEPT="application/json")
+            assert response.status_code == 200, f"{url}: {response.status_code}"
+
+            durations, _ = timed(
+                lambda: client.get(url, HTTP_ACCEPT="application/json"), repeat
+            )
+            results.update(latency_metrics(name, durations))
+            results[f"{name}_queries"] = len(queries)
+
+    return results
+
+
+def benchmark_serializers(count=5000, repeat=5):
+    """
+    Captions serialized per second through CaptionSerializer and
+    through the `caption_rows` fast path the list endpoint uses.
+    """
+    captions = list(Caption.objects.prefetch_related("speakers")[:count])
+    rows = list(caption_rows(Caption.objects.all())[:count])
+
+    serializer_durations, _ = timed(
+        lambda: CaptionSerializer(captions, many=True).data, repeat
+    )
+    row_durations, _ = timed(lambda: [caption_row_data(row) for row in rows], repeat)
+
+    return {
+        "serializer_captions_per_second": len(captions) / min(serializer_durations),
+        "row_data_captions_per_second": len(rows) / min(row_durations),
+    }
+
+
+@contextlib.contextmanager
+def disposable_database():
+    """
+    Creates a fresh test database with every migration applied, and
+    drops it on the way out, like the test runner does.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Metrics that got worse by more than `tolerance` (0.1 is 10%) since
+    `baseline`, as a list of (benchmark, metric, baseline, current).
+    Both are `results` dictionaries: {benchmark: {metric: value}}.
+    Query counts don't vary between runs, so any extra query counts.
+    """
+    regressions = []
+
+    for benchmark, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(benchmark, {}).get(metric)
+            if not previous:
+                continue
+
+            if metric.endswith("_queries"):
+                worse = value > previous
+            elif metric.endswith(LOWER_IS_BETTER):
+                worse = value > previous * (1 + tolerance)
+            elif metric.endswith(HIGHER_IS_BETTER):
+                worse = value < previous * (1 - tolerance)
+            else:
+                continue
+
+            if worse:
+                regressions.append((benchmark, metric, previous, value))
+
+    return regressions
@@ -0,0 +1,158 @@
+"""
+Who said a line. The subtitles spell cast members' names in several
+ways ("MATT", "Matt", "MATT (V.O.)", "MATTHEW"), and every spelling is
+a `CastMemberAlias` pointing to one `CastMember`:
+
+- `CastResolver` turns names into cast member ids during an import,
+  creating the ones it hasn't seen.
+- `merge_cast_members` folds duplicate cast members into one.
+"""
+from django.db import connection, transaction
+from episodes.models import (
+    Caption,
+    CastMember,
+    CastMemberAlias,
+    CorpusState,
+    Episode,
+    PhraseCount,
+    SpeakerStats,
+)
+from episodes.phrases import index_episode
+from episodes.text import normalize_speaker_name
+
+
+class CastResolver:
+    """
+    Maps speaker names to cast member ids. Every alias is loaded once
+    up front, so resolving known names never queries the database.
+    """
+
+    def __init__(self):
+        self.aliases = dict(CastMemberAlias.objects.values_list("alias", "castmember_id"))
+        # Cast members created by this resolver
+        self.created = []
+
+    def resolve(self, names):
+        """
+        Returns {name: cast member id} for every name in `names`. Names
+        without an alias get a new cast member, all of them created with
+        one insert.
+        """
+        keys = {name: normalize_speaker_name(name) for name in names}
+        missing = {}
+        for name, key in keys.items():
+            if key not in self.aliases:
+                missing.setdefault(key, name.strip())
+
+        if missing:
+            self.create(missing)
+
+        return {name: self.aliases[key] for name, key in keys.items()}
+
+    @transaction.atomic
+    def create(self, names):
+        """
+        Creates a cast member and its alias for each {alias: name}.
+        Another import may have added some of the aliases since they
+        were loaded: those are kept, and the cast members created here
+        for them are dropped.
+        """
+        cast_members = CastMember.objects.bulk_create(
+            CastMember(name=name) for name in names.values()
+        )
+        CastMemberAlias.objects.bulk_create(
+            [
+                CastMemberAlias(alias=alias, castmember=cast_member)
+                for alias, cast_member in zip(names, cast_members)
+            ],
+            ignore_conflicts=True,
+        )
+        self.aliases.update(
+            CastMemberAlias.objects.filter(alias__in=names).values_list(
+                "alias", "castmember_id"
+            )
+        )
+
+        unused = []
+        for alias, cast_member in zip(names, cast_members):
+            if self.aliases[alias] == cast_member.id:
+                self.created.append(cast_member)
+            else:
+                unused.append(cast_member.id)
+
+        if unused:
+            CastMember.objects.filter(id__in=unused).delete()
+
+
+def find_duplicates():
+    """
+    Groups of cast members whose names normalize to the same alias,
+    like "LIAM" and "LIAM ", as lists of ids, lowest first.
+    """
+    groups = {}
+    for cast_member_id, name in CastMember.objects.order_by("id").values_list(
+        "id", "name"
+    ):
+        groups.setdefault(normalize_speaker_name(name), []).append(cast_member_id)
+
+    return [ids for ids in groups.values() if len(ids) > 1]
+
+
+@transaction.atomic
+def merge_cast_members(merges):
+    """
+    For each {target id: [source ids]} in `merges`, moves every line and
+    alias of the source cast members to the target, then deletes them.
+    Speaker links are rewritten with two statements per target, however
+    many lines there are. Returns the number of links moved.
+    """
+    merges = {
+        target_id: [source_id for source_id in source_ids if source_id != target_id]
+        for target_id, source_ids in merges.items()
+    }
+    all_source_ids = [source_id for source_ids in merges.values() for source_id in source_ids]
+    if not all_source_ids:
+        return 0
+
+    links = Caption.speakers.through._meta.db_table
+    # Phrase counts group lines by who said them, so the episodes the
+    # merged cast members spoke in are counted again
+    episodes = list(
+        Episode.objects.filter(captions__speakers__in=all_source_ids)
+        .distinct()
+        .order_by("chapter")
+    )
+    moved = 0
+
+    with connection.cursor() as cursor:
+        for target_id, source_ids in merges.items():
+            # A caption said by both keeps a single link
+            cursor.execute(
+                f"""
+                INSERT INTO {links} (caption_id, castmember_id)
+                SELECT DISTINCT caption_id, %s
+                FROM {links}
+                WHERE castmember_id = ANY (%s)
+                ON CONFLICT (caption_id, castmember_id) DO NOTHING
+                """,
+                [target_id, source_ids],
+            )
+            cursor.execute(
+                f"DELETE FROM {links} WHERE castmember_id = ANY (%s)", [source_ids]
+            )
+            moved += cursor.rowcount
+
+            CastMemberAlias.objects.filter(castmember_id__in=source_ids).update(
+                castmember_id=target_id
+            )
+
+    CastMember.objects.filter(id__in=all_source_ids).delete()
+
+    for episode in episodes:
+        index_episode(episode, update_totals=False)
+
+    PhraseCount.refresh_totals()
+    SpeakerStats.refresh()
+    CorpusState.bump()
+
+    return moved
@@ -0,0 +1,132 @@
+"""
+Streaming corpus export. Rows are read through a server-side cursor
+and written out as they arrive, so memory use doesn't grow with the
+number of captions and the first bytes go out right away.
+"""
+import csv
+import json
+import zlib
+
+from django.db.models import F
+from episodes.models import Caption
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+EXPORT_COLUMNS = (
+    "id",
+    "chapter",
+    "sequence",
+    "start",
+    "end",
+    "section",
+    "speakers",
+    "text",
+)
+
+# Rows fetched from the server-side cursor at a time
+CHUNK_SIZE = 2000
+# Output is buffered up to this many characters before being yielded
+BUFFER_SIZE = 64 * 1024
+
+
+def export_rows(captions, chunk_size=CHUNK_SIZE):
+    """
+    Yields one dictionary per caption with EXPORT_COLUMNS, ordered by
+    chapter. Episode chapters and speaker names are joined in SQL.
+    `start` and `end` are in seconds.
+    """
+    rows = (
+        captions.prefetch_related(None)
+        .order_by("episode__chapter", "sequence")
+        .values(
+            "id",
+            "sequence",
+            "start_ms",
+            "end_ms",
+            "section",
+            "text",
+            chapter=F("episode__chapter"),
+            speaker_names=Caption.speaker_array("castmember__name"),
+        )
+    )
+
+    for row in rows.iterator(chunk_size=chunk_size):
+        row["start"] = row.pop("start_ms") / 1000
+        row["end"] = row.pop("end_ms") / 1000
+        row["text"] = Caption.display_text(row["text"])
+        row["speakers"] = row.pop("speaker_names") or []
+        yield row
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(
+            {column: row[column] for column in EXPORT_COLUMNS}, ensure_ascii=False
+        ) + "\n"
+
+
+class Echo:
+    """
+    File-like object whose `write` returns what it was given, so
+    csv.writer can be used to format one row at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+
+    for row in rows:
+        yield writer.writerow(
+            [
+                "|".join(row[column]) if column == "speakers" else row[column]
+                for column in EXPORT_COLUMNS
+            ]
+        )
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """
+    Joins small string chunks into ~`size` ones and encodes them.
+    """
+    buffer = []
+    buffered_size = 0
+
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered_size += len(chunk)
+
+        if buffered_size >= size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            buffered_size = 0
+
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+
+    yield compressor.flush()
+
+
+def export_captions(captions, output_format="ndjson", compress=False):
+    """
+    Yields the export of `captions` as bytes.
+    """
+    rows = export_rows(captions)
+    lines = iter_csv(rows) if output_format == "csv" else iter_ndjson(rows)
+    chunks = buffered(lines)
+
+    return gzipped(chunks) if compress else chunks
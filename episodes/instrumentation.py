@@ -0,0 +1,137 @@
+"""
+Per-request timings, to tell whether a slow response is spent in SQL,
+in the view (which for these viewsets is mostly serialization) or in
+rendering. Enable with INSTRUMENT_REQUESTS = True, see
+`InstrumentationMiddleware`.
+
+Each request is measured with a `RequestMetrics` held in a context
+variable. Queries are timed with a database execute wrapper.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+current_metrics = contextvars.ContextVar("current_metrics", default=None)
+
+# Upper bounds in milliseconds (or number of queries), the last bucket
+# counts everything above
+HISTOGRAM_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SLOWEST_QUERIES = 5
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_queries = []
+        self.phases = {}
+        # Set when the view starts, see InstrumentationMiddleware
+        self.view_start = None
+        self.view_sql_start = None
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+
+        self.slowest_queries.append((duration, sql))
+        self.slowest_queries.sort(key=lambda query: -query[0])
+        del self.slowest_queries[SLOWEST_QUERIES:]
+
+    def add(self, phase, duration):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total):
+        """
+        The Server-Timing header value, durations in milliseconds.
+        """
+        metrics = [f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"']
+        metrics += [
+            f"{phase};dur={duration * 1000:.1f}" for phase, duration in self.phases.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper timing every query of the current request.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - start)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        labels = [f"<={bound}" for bound in HISTOGRAM_BUCKETS]
+        labels.append(f">{HISTOGRAM_BUCKETS[-1]}")
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class RequestStats:
+    """
+    Aggregated metrics per view, for this process only: each worker
+    keeps its own.
+    """
+
+    metrics = ("total", "db", "queries", "serialize", "render")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view, values):
+        with self.lock:
+            histograms = self.views.setdefault(
+                view, {metric: Histogram() for metric in self.metrics}
+            )
+            for metric, value in values.items():
+                histograms[metric].add(value)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                view: {
+                    metric: histogram.as_dict() for metric, histogram in histograms.items()
+                }
+                for view, histograms in sorted(self.views.items())
+            }
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+stats = RequestStats()
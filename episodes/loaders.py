@@ -0,0 +1,158 @@
+"""
+Loaders write an episode's captions and their speaker links to the
+database. Captions are passed in as dictionaries with the keys
+`sequence`, `start` and `end` (milliseconds), `text`, `normalized_text`
+and `speaker_ids` (CastMember ids).
+
+Both steps are timed as the "caption_insert" and "speaker_link_insert"
+phases of the `timer` passed to `load`, if any.
+"""
+import io
+
+from django.db import connection
+from episodes.models import Caption
+from episodes.profiling import PhaseTimer
+
+LOADERS = ("bulk", "copy")
+
+
+class BulkCreateLoader:
+    """
+    Portable loader, uses `bulk_create` for both tables.
+    """
+
+    def load(self, episode, captions, timer=None):
+        timer = timer or PhaseTimer()
+
+        with timer.phase("caption_insert"):
+            instances = Caption.objects.bulk_create(
+                [
+                    Caption(
+                        episode=episode,
+                        sequence=caption["sequence"],
+                        text=caption["text"],
+                        normalized_text=caption["normalized_text"],
+                        start_ms=caption["start"],
+                        end_ms=caption["end"],
+                    )
+                    for caption in captions
+                ]
+            )
+
+        with timer.phase("speaker_link_insert"):
+            Caption.speakers.through.objects.bulk_create(
+                [
+                    Caption.speakers.through(
+                        caption_id=instance.id, castmember_id=castmember_id
+                    )
+                    for caption, instance in zip(captions, instances)
+                    for castmember_id in caption["speaker_ids"]
+                ]
+            )
+
+
+def copy_value(value):
+    """
+    Formats a value for COPY's text format.
+    """
+    if value is None:
+        return r"\N"
+
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyLoader:
+    """
+    Postgres-only loader. Caption ids are taken from the table's sequence
+    up front, so both tables can be streamed with COPY FROM STDIN without
+    waiting for the database to return the new ids.
+    """
+
+    caption_fields = (
+        "id",
+        "episode",
+        "sequence",
+        "start_ms",
+        "end_ms",
+        "section",
+        "text",
+        "normalized_text",
+    )
+
+    def allocate_ids(self, cursor, count):
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [Caption._meta.db_table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def copy(self, cursor, table, columns, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        quote_name = connection.ops.quote_name
+        cursor.copy_expert(
+            f"COPY {quote_name(table)} ({', '.join(map(quote_name, columns))}) FROM STDIN",
+            buffer,
+        )
+
+    def load(self, episode, captions, timer=None):
+        timer = timer or PhaseTimer()
+        through = Caption.speakers.through
+
+        with connection.cursor() as cursor, timer.phase("caption_insert"):
+            caption_ids = self.allocate_ids(cursor, len(captions))
+
+            self.copy(
+                cursor,
+                Caption._meta.db_table,
+                [Caption._meta.get_field(name).column for name in self.caption_fields],
+                (
+                    (
+                        caption_id,
+                        episode.id,
+                        caption["sequence"],
+                        caption["start"],
+                        caption["end"],
+                        None,
+                        caption["text"],
+                        caption["normalized_text"],
+                    )
+                    for caption_id, caption in zip(caption_ids, captions)
+                ),
+            )
+
+        with connection.cursor() as cursor, timer.phase("speaker_link_insert"):
+            self.copy(
+                cursor,
+                through._meta.db_table,
+                [
+                    through._meta.get_field("caption").column,
+                    through._meta.get_field("castmember").column,
+                ],
+                (
+                    (caption_id, castmember_id)
+                    for caption_id, caption in zip(caption_ids, captions)
+                    for castmember_id in caption["speaker_ids"]
+                ),
+            )
+
+
+def get_loader(name):
+    """
+    Returns the loader called `name`, falling back to `bulk_create`
+    when the database can't COPY.
+    """
+    if name == "copy" and connection.vendor == "postgresql":
+        return CopyLoader()
+
+    return BulkCreateLoader()
@@ -0,0 +1,164 @@
+import datetime
+import json
+import platform
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from episodes.benchmarks import (
+    benchmark_import,
+    benchmark_requests,
+    benchmark_serializers,
+    benchmark_vtt_parse,
+    compare,
+    disposable_database,
+    synthetic_corpus,
+)
+from episodes.loaders import LOADERS
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark parsing, importing, API requests and serialization "
+        "against a disposable database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-p",
+            "--path",
+            type=str,
+            default="subtitles",
+            help="Path to directory containing subtitles",
+        )
+        parser.add_argument(
+            "-s",
+            "--scale",
+            type=int,
+            default=1,
+            help="Copies of each subtitle file in the synthetic corpus, e.g. 10 or 100",
+        )
+        parser.add_argument(
+            "-e",
+            "--episodes",
+            type=int,
+            help="Only use the first N episodes (before scaling)",
+        )
+        parser.add_argument(
+            "-l", "--loader", choices=LOADERS, default="bulk", help="Import loader"
+        )
+        parser.add_argument(
+            "-w", "--workers", type=int, default=1, help="Import parser processes"
+        )
+        parser.add_argument(
+            "-r",
+            "--repeat",
+            type=int,
+            default=20,
+            help="Requests per endpoint",
+        )
+        parser.add_argument(
+            "--parse-only",
+            action="store_true",
+            help="Only benchmark VTT parsing, without a database",
+        )
+        parser.add_argument(
+            "-o", "--output", type=str, help="Write the results as JSON to this file"
+        )
+        parser.add_argument(
+            "-b",
+            "--baseline",
+            type=str,
+            help="Results file to compare against, regressions fail the command",
+        )
+        parser.add_argument(
+            "-t",
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="How much worse than the baseline a metric can get, 0.1 is 10%%",
+        )
+
+    def handle(
+        self,
+        path,
+        scale,
+        episodes,
+        loader,
+        workers,
+        repeat,
+        parse_only,
+        output,
+        baseline,
+        tolerance,
+        *args,
+        **kwargs,
+    ):
+        results = {}
+
+        with tempfile.TemporaryDirectory() as corpus:
+            files = synthetic_corpus(path, corpus, scale, episodes)
+            print(f"Synthetic corpus: {files} files ({scale}x)")
+
+            print("Parsing...")
+            results["vtt_parse"] = benchmark_vtt_parse(corpus)
+
+            if not parse_only:
+                with disposable_database():
+                    print("Importing...")
+                    results["import"] = benchmark_import(corpus, loader, workers)
+                    print("Requesting...")
+                    results["requests"] = benchmark_requests(repeat)
+                    print("Serializing...")
+                    results["serializers"] = benchmark_serializers()
+
+        for benchmark, metrics in results.items():
+            print(f"\n{benchmark}")
+            for metric, value in metrics.items():
+                print(f"  {metric:<40} {value:>14.2f}")
+
+        options = {
+            "scale": scale,
+            "episodes": episodes,
+            "loader": loader,
+            "workers": workers,
+            "repeat": repeat,
+        }
+
+        if output:
+            with open(output, "w") as f:
+                json.dump(
+                    {
+                        "created": datetime.datetime.now().isoformat(),
+                        "options": options,
+                        "environment": {
+                            "python": platform.python_version(),
+                            "django": django.get_version(),
+                            "machine": platform.machine(),
+                            "processor": platform.processor(),
+                        },
+                        "results": results,
+                    },
+                    f,
+                    indent=2,
+                )
+
+        if baseline:
+            with open(baseline) as f:
+                baseline_data = json.load(f)
+
+            if baseline_data["options"] != options:
+                print(
+                    f"\nWarning: the baseline was run with {baseline_data['options']}, "
+                    "timings may not be comparable"
+                )
+
+            regressions = compare(results, baseline_data["results"], tolerance)
+
+            if regressions:
+                print("\nRegressions:")
+                for benchmark, metric, previous, value in regressions:
+                    print(f"  {benchmark}.{metric}: {previous:.2f} -> {value:.2f}")
+                raise CommandError(f"{len(regressions)} metrics regressed")
+
+            print(f"\nNo regressions against {baseline}")
@@ -0,0 +1,35 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from episodes.models import CorpusState, Episode, PhraseCount
+from episodes.phrases import index_episode
+
+
+class Command(BaseCommand):
+    help = "Rebuild the phrase counts behind /api/phrase/"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "chapters",
+            nargs="*",
+            type=int,
+            help="Only these episodes, defaults to all of them",
+        )
+
+    def handle(self, chapters, *args, **kwargs):
+        start = datetime.datetime.now()
+        episodes = Episode.objects.order_by("chapter")
+        if chapters:
+            episodes = episodes.filter(chapter__in=chapters)
+
+        # A few episodes move the totals by their difference, a full
+        # rebuild sums them up once at the end
+        for episode in episodes:
+            print(f"Counting phrases in Episode {episode}")
+            index_episode(episode, update_totals=bool(chapters))
+
+        if not chapters:
+            PhraseCount.refresh_totals()
+        CorpusState.bump()
+
+        print(f"Total time: {datetime.datetime.now() - start}")
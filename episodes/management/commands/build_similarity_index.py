@@ -0,0 +1,28 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from episodes.models import Caption, CorpusState
+from episodes.similarity import build_index
+
+
+class Command(BaseCommand):
+    help = "Build the TF-IDF index behind /api/caption/{id}/similar/"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-o",
+            "--output",
+            type=str,
+            default=str(settings.SIMILARITY_INDEX_PATH),
+            help="Index file, defaults to SIMILARITY_INDEX_PATH",
+        )
+
+    def handle(self, output, *args, **kwargs):
+        start = datetime.datetime.now()
+        index = build_index(Caption.objects.all())
+        index.save(output)
+        CorpusState.bump()
+
+        print(f"{len(index)} captions indexed in {output}")
+        print(f"Total time: {datetime.datetime.now() - start}")
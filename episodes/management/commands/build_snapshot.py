@@ -0,0 +1,24 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from episodes.snapshot import Snapshot, build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write the corpus to a memory-mappable columnar snapshot (see episodes/snapshot.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-o",
+            "--output",
+            type=str,
+            default="snapshot",
+            help="Snapshot directory, replaced if it exists",
+        )
+
+    def handle(self, output, *args, **kwargs):
+        start = datetime.datetime.now()
+        build_snapshot(output)
+
+        print(f"{len(Snapshot(output))} captions written to {output}")
+        print(f"Total time: {datetime.datetime.now() - start}")
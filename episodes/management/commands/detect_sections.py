@@ -0,0 +1,26 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from episodes.models import Caption, Episode
+
+
+class Command(BaseCommand):
+    help = "Tag every caption with its section, detected from Matt's cue phrases"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "chapters",
+            nargs="*",
+            type=int,
+            help="Only these episodes, defaults to all of them",
+        )
+
+    def handle(self, chapters, *args, **kwargs):
+        start = datetime.datetime.now()
+        episodes = Episode.objects.order_by("chapter")
+        if chapters:
+            episodes = episodes.filter(chapter__in=chapters)
+
+        Caption.apply_sections(episodes)
+
+        print(f"Total time: {datetime.datetime.now() - start}")
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from episodes.export import EXPORT_FORMATS, export_captions
+from episodes.models import Caption
+
+
+class Command(BaseCommand):
+    help = "Export every caption as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-f",
+            "--format",
+            dest="output_format",
+            choices=EXPORT_FORMATS,
+            default="ndjson",
+            help="Output format",
+        )
+        parser.add_argument(
+            "-o", "--output", type=str, help="Output file, defaults to stdout"
+        )
+        parser.add_argument(
+            "-z", "--gzip", action="store_true", help="Compress the output with gzip"
+        )
+
+    def handle(self, output_format, output, gzip, *args, **kwargs):
+        chunks = export_captions(Caption.objects.all(), output_format, gzip)
+
+        if output is None:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
@@ -1,18 +1,42 @@
+import collections
 import datetime
+import io
+import itertools
+import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 
 import humanfriendly
-import webvtt
 from django.core.management.base import BaseCommand
-from episodes.models import Caption, CastMember, Episode
-
-TITLE_PATTERN = r"^(?P<title>.+?)(?P<campaign> ?[-_] .*)Episode (?P<chapter>\d+).*?-(?P<video_id>[\w-]+)\.en\.vtt$"
-
-EMOTION_PATTERN = r"^[\(\[](?P<emotion>.+)[\)\]]$"
-MUSIC_PATTERN = r"^(?P<music>♪ .* ♪)"
-
-SPEAKERS_PATTERN = r"(?P<cast>([A-Z\(\)\. ]+)((?:, *[A-Z]+)*),? *(and )*([A-Z]+)*):"
+from django.db import transaction
+from episodes.cast import CastResolver
+from episodes.loaders import LOADERS, get_loader
+from episodes.models import (
+    Caption,
+    CorpusState,
+    Episode,
+    RawCaptions,
+    SpeakerStats,
+)
+from episodes.phrases import index_episode
+from episodes.profiling import PhaseTimer, profiled
+from episodes.text import normalize_text
+from episodes.vtt import Cue, read_cues
+
+TITLE_PATTERN = re.compile(
+    r"^(?P<title>.+?)(?P<campaign> ?[-_] .*)Episode (?P<chapter>\d+).*?-(?P<video_id>[\w-]+)\.en\.vtt$"
+)
+
+EMOTION_PATTERN = re.compile(r"^[\(\[](?P<emotion>.+)[\)\]]$")
+MUSIC_PATTERN = re.compile(r"^(?P<music>♪ .* ♪)")
+
+SPEAKERS_PATTERN = re.compile(
+    r"(?P<cast>([A-Z\(\)\. ]+)((?:, *[A-Z]+)*),? *(and )*([A-Z]+)*):"
+)
+SPEAKERS_SEPARATOR_PATTERN = re.compile(r",? (and|AND) ")
+SPEAKERS_SPLIT_PATTERN = re.compile(", +?")
+VOICE_OVER_PATTERN = re.compile(r" \(V\.?O\.?\)")
 
 
 def parse_episode_subtitles(path):
@@ -27,14 +51,30 @@ def parse_episode_subtitles(path):
     parsed = []
 
     for fn in filenames:
-        episode_data = re.match(TITLE_PATTERN, fn)
+        episode_data = TITLE_PATTERN.match(fn)
         if episode_data is not None:
             parsed.append(dict(**episode_data.groupdict(), filename=fn))
 
     return sorted(parsed, key=lambda x: int(x["chapter"]))
 
 
-def split_subtitle(caption):
+def get_midpoint(start, end):
+    """
+    Halfway between two millisecond timestamps, rounded the same way
+    webvtt-py rounded it when the importer still used it, so
+    re-imports don't shift any split captions.
+    """
+    start_in_seconds = start // 1000 + start % 1000 / 1000
+    end_in_seconds = end // 1000 + end % 1000 / 1000
+    total_seconds = start_in_seconds + (end_in_seconds - start_in_seconds) / 2
+    hours = int(total_seconds / 3600)
+    minutes = int(total_seconds / 60 - hours * 60)
+    seconds = total_seconds - hours * 3600 - minutes * 60
+    milliseconds = int("{:.3f}".format(seconds).replace(".", ""))
+    return (hours * 3600 + minutes * 60) * 1000 + milliseconds
+
+
+def split_subtitle(cue):
     """
     Most subtitles only contain lines from a single person. Sometimes
     they have more than two, like this:
@@ -43,7 +83,7 @@ def split_subtitle(caption):
     LIAM: Hi there.
     SAM: Hello.
 
-    If that's the case, this splits them in two webvtt.Caption instances
+    If that's the case, this splits them in two vtt.Cue instances
     like this:
 
     00:00:10.000 --> 00:00:11.000
@@ -52,34 +92,98 @@ def split_subtitle(caption):
     00:00:11.000 --> 00:00:12.000
     SAM: Hello.
     """
-    caption_length = len(caption.lines)
+    if len(cue.lines) < 2:
+        return [cue]
 
-    if caption_length == 1:
-        return [caption]
+    if not SPEAKERS_PATTERN.match(cue.lines[1]):
+        return [cue]
 
-    if not re.match(SPEAKERS_PATTERN, caption.lines[1]):
-        return [caption]
+    half_time = get_midpoint(cue.start, cue.end)
 
-    half_time = (caption.end_in_seconds - caption.start_in_seconds) / 2
+    return [
+        Cue(cue.start, half_time, (cue.lines[0],)),
+        Cue(half_time, cue.end, (cue.lines[1],)),
+    ]
 
-    first = webvtt.Caption(
-        start=caption.start,
-        end=caption._to_timestamp(caption.start_in_seconds + half_time),
-        text=caption.lines[0],
-    )
 
-    second = webvtt.Caption(
-        start=caption._to_timestamp(caption.start_in_seconds + half_time),
-        end=caption.end,
-        text=caption.lines[1],
-    )
+def get_episode_subtitles(file):
+    return read_cues(file)
 
-    return [first, second]
 
+def join_captions(cues):
+    """
+    Splits captions with more than one speaker and glues continuation
+    lines back onto the caption that started the speech, in a single
+    pass over `cues`. Yields plain dictionaries with `start` and `end`
+    in milliseconds, so they can be passed between processes.
+    """
+    first_caption_in_speech = None
+
+    for original_cue in cues:
+        for cue in split_subtitle(original_cue):
+            text = cue.text
+            match = SPEAKERS_PATTERN.match(text)
+            speakers = match.group("cast") if match else None
+
+            if speakers is None:
+                # This line is a multiple-cast emotion, like "(laughs)",
+                # or a line in the song from the D&D Beyond ad that starts
+                # in episode 107. Those were never imported.
+                if EMOTION_PATTERN.match(text) or MUSIC_PATTERN.match(text):
+                    continue
+
+                # This line is a continuation of a previous line
+                if first_caption_in_speech is not None:
+                    first_caption_in_speech["lines"] += cue.lines
+                    first_caption_in_speech["end"] = cue.end
+                continue
+
+            if first_caption_in_speech is not None:
+                yield first_caption_in_speech
+
+            first_caption_in_speech = {
+                "start": cue.start,
+                "end": cue.end,
+                "lines": list(cue.lines),
+                "speakers": Command.get_speakers(speakers),
+            }
+
+    if first_caption_in_speech is not None:
+        yield first_caption_in_speech
+
+
+def parse_episode(directory, episode, profile_directory=None):
+    """
+    Reads and parses a single episode's subtitle file. `episode` is one
+    of the dictionaries returned by `parse_episode_subtitles`. This
+    doesn't touch the database, so it can run in a worker process.
 
-def get_episode_subtitles(filename):
-    parser = webvtt.webvtt.WebVTT()
-    return parser.read(filename).captions
+    The phase timings and counters come back as `profile`, see
+    `PhaseTimer.as_dict`.
+    """
+    subtitle_abspath = os.path.join(directory, episode["filename"])
+    timer = PhaseTimer()
+
+    with profiled(profile_directory, f'episode-{episode["chapter"]}-parse'):
+        with timer.phase("file_read"):
+            with open(subtitle_abspath) as f:
+                raw_captions = f.read()
+
+        # Cues are parsed as they're joined, each in its own phase
+        cues = timer.timed(
+            "vtt_parse", get_episode_subtitles(io.StringIO(raw_captions)), "cues"
+        )
+        with timer.phase("speaker_join"):
+            captions = list(join_captions(cues))
+
+    timer.count("captions", len(captions))
+
+    return dict(
+        **episode,
+        raw_captions=raw_captions,
+        captions=captions,
+        profile=timer.as_dict(),
+    )
 
 
 class Command(BaseCommand):
@@ -89,17 +193,38 @@ class Command(BaseCommand):
         parser.add_argument(
             "-p", "--path", type=str, help="Path to directory containing subtitles"
         )
-
-    cast_member_cache = {}
-
-    def get_cast_member(self, name):
-        name = name.strip()
-        if cast_member := self.cast_member_cache.get(name):
-            return cast_member
-
-        self.cast_member_cache[name] = CastMember.objects.create(name=name)
-        print(f"Added to cast: {name}")
-        return self.cast_member_cache[name]
+        parser.add_argument(
+            "-f",
+            "--force",
+            action="store_true",
+            help="Re-import episodes even if their subtitle file didn't change",
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes used to parse subtitle files",
+        )
+        parser.add_argument(
+            "-l",
+            "--loader",
+            choices=LOADERS,
+            default="bulk",
+            help="How captions are written: bulk_create, or Postgres' COPY",
+        )
+        parser.add_argument(
+            "--profile",
+            type=str,
+            metavar="DIRECTORY",
+            help="Write cProfile stats for each episode to this directory",
+        )
+        parser.add_argument(
+            "--summary",
+            type=str,
+            metavar="FILE",
+            help="Write phase timings and counters as JSON to this file",
+        )
 
     @staticmethod
     def get_speakers(attribution_string):
@@ -112,14 +237,14 @@ class Command(BaseCommand):
             "LIAM, LAURA, MATT and ASHLEY"
         """
         # Normalize separators
-        attribution_string = re.sub(r",? (and|AND) ", ", ", attribution_string)
+        attribution_string = SPEAKERS_SEPARATOR_PATTERN.sub(", ", attribution_string)
 
         # Remove extraneous information
-        attribution_string = re.sub(r" \(V\.?O\.?\)", "", attribution_string)
+        attribution_string = VOICE_OVER_PATTERN.sub("", attribution_string)
 
         return [
             line
-            for line in re.split(", +?", attribution_string)
+            for line in SPEAKERS_SPLIT_PATTERN.split(attribution_string)
             # Avoid issue from this line:
             # https://www.youtube.com/embed/_jDCU8IRyfA?start=222&end=246
             if len(line) > 2
@@ -149,90 +274,233 @@ class Command(BaseCommand):
 
         return humanfriendly.format_timespan(abs(time_until_end), max_units=2)
 
-    def handle(self, path, *args, **kwargs):
-        absolute_path = os.path.abspath(path)
-        parsed_subtitles = parse_episode_subtitles(absolute_path)
-        subtitle_parser = webvtt.WebVTT()
+    def parse_episodes(self, directory, episodes, workers, profile_directory=None):
+        """
+        Yields parsed episodes in the same order as `episodes`. With more
+        than one worker, parsing happens in a process pool while the
+        caller writes earlier episodes to the database. Only a few
+        episodes per worker are parsed ahead, so parsed captions don't
+        pile up in memory when the database is the slower side.
+        """
+        if workers <= 1:
+            for episode in episodes:
+                yield parse_episode(directory, episode, profile_directory)
+            return
+
+        episodes = iter(episodes)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque(
+                executor.submit(parse_episode, directory, episode, profile_directory)
+                for episode in itertools.islice(episodes, workers * 2)
+            )
+            while pending:
+                parsed = pending.popleft().result()
+                for episode in itertools.islice(episodes, 1):
+                    pending.append(
+                        executor.submit(
+                            parse_episode, directory, episode, profile_directory
+                        )
+                    )
+                yield parsed
 
-        self.episode_count = len(parsed_subtitles)
+    def find_changed_episodes(self, directory, episodes, force=False):
+        """
+        Returns the episodes whose subtitle file is new or changed, each
+        paired with its existing `Episode` (or None). A matching mtime and
+        size skips the file without reading it; otherwise it's hashed.
+        """
+        existing_episodes = {
+            episode.subtitle_filename: episode
+            for episode in Episode.objects.order_by("id")
+        }
+        changed = []
+
+        for episode in episodes:
+            subtitle_abspath = os.path.join(directory, episode["filename"])
+            stat = os.stat(subtitle_abspath)
+            existing = existing_episodes.get(episode["filename"])
+
+            episode["subtitle_mtime"] = stat.st_mtime
+            episode["subtitle_size"] = stat.st_size
+
+            if (
+                not force
+                and existing is not None
+                and existing.subtitle_mtime == stat.st_mtime
+                and existing.subtitle_size == stat.st_size
+            ):
+                continue
 
-        for episode in parsed_subtitles:
-            start = datetime.datetime.now()
-            subtitle_abspath = os.path.join(absolute_path, episode["filename"])
+            with open(subtitle_abspath) as f:
+                episode["subtitle_hash"] = Episode.hash_subtitles(f.read())
+
+            if (
+                not force
+                and existing is not None
+                and existing.subtitle_hash == episode["subtitle_hash"]
+            ):
+                # Touched but not changed, remember the new stat so the
+                # next run doesn't have to read it again
+                existing.subtitle_mtime = stat.st_mtime
+                existing.subtitle_size = stat.st_size
+                existing.save(update_fields=["subtitle_mtime", "subtitle_size"])
+                continue
+
+            changed.append((episode, existing))
+
+        return changed
+
+    @transaction.atomic
+    def save_episode(self, parsed, existing=None, timer=None):
+        """
+        Creates the episode, or replaces all captions of an existing one.
+        Runs in a transaction, so a failed import leaves the previous
+        captions in place. Each step is timed in `timer`.
+        """
+        timer = timer or PhaseTimer()
+        episode_fields = dict(
+            chapter=parsed["chapter"],
+            video_id=parsed["video_id"],
+            title=parsed["title"].strip(),
+            subtitle_filename=parsed["filename"],
+            subtitle_hash=parsed["subtitle_hash"],
+            subtitle_mtime=parsed["subtitle_mtime"],
+            subtitle_size=parsed["subtitle_size"],
+        )
 
-            print(
-                f'[{self.get_time_until_done()}]\t Creating Episode {episode["chapter"]} - {episode["title"]}'
+        with timer.phase("episode_write"):
+            if existing is None:
+                new_episode = Episode.objects.create(**episode_fields)
+            else:
+                new_episode = existing
+                new_episode.captions.all().delete()
+                for field, value in episode_fields.items():
+                    setattr(new_episode, field, value)
+                new_episode.save()
+
+            RawCaptions.store(new_episode, parsed["raw_captions"])
+
+        with timer.phase("cast_lookup"):
+            created = len(self.cast.created)
+            cast_member_ids = self.cast.resolve(
+                {person for caption in parsed["captions"] for person in caption["speakers"]}
             )
-            with open(subtitle_abspath) as f:
-                new_episode = Episode.objects.create(
-                    chapter=episode["chapter"],
-                    video_id=episode["video_id"],
-                    title=episode["title"].strip(),
-                    subtitle_filename=episode["filename"],
-                    raw_captions=f.read(),
+            speaker_ids = [
+                [cast_member_ids[person] for person in caption["speakers"]]
+                for caption in parsed["captions"]
+            ]
+            for cast_member in self.cast.created[created:]:
+                print(f"Added to cast: {cast_member.name}")
+
+        with timer.phase("text_normalize"):
+            captions = []
+            for sequence, caption in enumerate(parsed["captions"]):
+                text = Caption.join_lines(caption["lines"])
+                captions.append(
+                    dict(
+                        caption,
+                        sequence=sequence,
+                        text=text,
+                        normalized_text=normalize_text(text),
+                        speaker_ids=speaker_ids[sequence],
+                    )
                 )
 
-            episode_captions = subtitle_parser.read(subtitle_abspath).captions
-
-            first_caption_in_speech = None
-            joined_captions = []
-
-            for original_caption in episode_captions:
-                for vtt in split_subtitle(original_caption):
-                    match = re.match(SPEAKERS_PATTERN, vtt.text)
-                    speakers = match.groupdict().get("cast") if match else None
-
-                    if speakers is None:
-                        # This line is a continuation of a previous line,
-                        # or a multiple-cast emotion, like "(laughs)"
-                        if bool(re.match(EMOTION_PATTERN, vtt.text)):
-                            speaker_names = ["ALL"]
-                        # This is a line in the song from the D&D Beyond
-                        # ad that starts in episode 107
-                        elif bool(re.match(MUSIC_PATTERN, vtt.text)):
-                            speaker_names = ["MUSIC"]
-                        else:
-                            first_caption_in_speech._lines += vtt.lines
-                            first_caption_in_speech._end = vtt._end
-                        continue
-                    else:
-                        speaker_names = self.get_speakers(speakers)
-                        first_caption_in_speech = vtt
-
-                    vtt.speakers = speaker_names
-                    joined_captions.append(vtt)
-
-            instances = Caption.objects.bulk_create(
-                [
-                    Caption(
-                        episode=new_episode,
-                        text=" ".join(caption._lines),
-                        lines=caption._lines,
-                        duration=datetime.timedelta(
-                            seconds=caption._end - caption._start
-                        ),
-                        start=datetime.timedelta(seconds=caption._start),
-                        end=datetime.timedelta(seconds=caption._end),
-                    )
-                    for caption in joined_captions
-                ]
+        timer.count("speaker_links", sum(len(ids) for ids in speaker_ids))
+        self.loader.load(new_episode, captions, timer)
+
+        with timer.phase("search_vectors"):
+            Caption.update_search_vectors(new_episode.captions.all())
+        with timer.phase("sections"):
+            Caption.apply_sections(
+                [new_episode], refresh_stats=False, overrides=self.section_overrides
             )
+        with timer.phase("phrases"):
+            index_episode(new_episode)
 
-            line_assignments = []
+    def print_profile(self, timer, wall_time):
+        total = sum(timer.timings.values())
+        print(f"{'Phase':<20} {'Seconds':>10} {'Share':>7}")
+        for phase, seconds in sorted(timer.timings.items(), key=lambda item: -item[1]):
+            print(f"{phase:<20} {seconds:>10.2f} {seconds / total:>7.1%}")
+        print(", ".join(f"{value} {name}" for name, value in timer.counters.items()))
 
-            for vtt, instance in zip(joined_captions, instances):
-                for person in vtt.speakers:
-                    line_assignments.append(
-                        Caption.speakers.through(
-                            caption_id=instance.id,
-                            castmember_id=self.get_cast_member(person).id,
-                        )
-                    )
+        if self.workers > 1:
+            print(
+                f"Phases add up to {total:.2f}s in {wall_time.total_seconds():.2f}s, "
+                f"parsing ran on {self.workers} processes"
+            )
 
-            Caption.speakers.through.objects.bulk_create(line_assignments)
+    def write_summary(self, summary_path, episodes, totals, wall_time):
+        summary = {
+            "started": self.start_time.isoformat(),
+            "wall_time": wall_time.total_seconds(),
+            "workers": self.workers,
+            "loader": type(self.loader).__name__,
+            "totals": totals.as_dict(),
+            "episodes": episodes,
+        }
+
+        with open(summary_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    def handle(
+        self, path, workers, force, loader, profile, summary, *args, **kwargs
+    ):
+        self.loader = get_loader(loader)
+        self.cast = CastResolver()
+        self.section_overrides = Caption.load_section_overrides()
+        self.workers = workers
+        absolute_path = os.path.abspath(path)
+        parsed_subtitles = parse_episode_subtitles(absolute_path)
+        changed = self.find_changed_episodes(absolute_path, parsed_subtitles, force)
+        existing_episodes = [existing for _, existing in changed]
 
-            end = datetime.datetime.now()
+        print(
+            f"{len(parsed_subtitles) - len(changed)} episodes unchanged, "
+            f"{len(changed)} to import"
+        )
+
+        self.episode_count = len(changed)
+        self.start_time = datetime.datetime.now()
+        self.times_per_episode = []
+
+        start = self.start_time
+        parsed_episodes = self.parse_episodes(
+            absolute_path, [episode for episode, _ in changed], workers, profile
+        )
+        totals = PhaseTimer()
+        episode_profiles = []
 
+        for parsed, existing in zip(parsed_episodes, existing_episodes):
+            action = "Creating" if existing is None else "Updating"
+            print(
+                f'[{self.get_time_until_done()}]\t {action} Episode {parsed["chapter"]} - {parsed["title"]}'
+            )
+            timer = PhaseTimer.from_dict(parsed.pop("profile"))
+            with profiled(profile, f'episode-{parsed["chapter"]}-save'):
+                self.save_episode(parsed, existing, timer)
+
+            totals.update(timer)
+            episode_profiles.append(
+                dict(chapter=int(parsed["chapter"]), **timer.as_dict())
+            )
+
+            # With a process pool this measures throughput rather than
+            # the time spent on a single episode, which keeps the ETA honest.
+            end = datetime.datetime.now()
             self.times_per_episode.append(end - start)
+            start = end
+
+        if changed:
+            with totals.phase("stats_refresh"):
+                SpeakerStats.refresh()
+            CorpusState.bump()
+
+        wall_time = datetime.datetime.now() - self.start_time
+        if changed:
+            self.print_profile(totals, wall_time)
+        if summary:
+            self.write_summary(summary, episode_profiles, totals, wall_time)
 
-        print(f"Total time: {datetime.datetime.now() - self.start_time}")
+        print(f"Total time: {wall_time}")
@@ -0,0 +1,61 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from episodes.cast import find_duplicates, merge_cast_members
+from episodes.models import CastMember, CastMemberAlias
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge cast members into the first one given. Without arguments, "
+        "merges cast members whose names only differ in case, spacing or (V.O.)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "cast_members",
+            nargs="*",
+            help="Cast member ids or names, e.g. MATT MATTHEW",
+        )
+        parser.add_argument(
+            "-n",
+            "--dry-run",
+            action="store_true",
+            help="Only show what would be merged",
+        )
+
+    def get_cast_member_id(self, value):
+        if value.isdigit():
+            if not CastMember.objects.filter(id=value).exists():
+                raise CommandError(f"No cast member with id {value}")
+            return int(value)
+
+        cast_member_id = CastMemberAlias.castmember_id(value).first()
+        if cast_member_id is None:
+            raise CommandError(f"No cast member called {value}")
+        return cast_member_id["castmember_id"]
+
+    def handle(self, cast_members, dry_run, *args, **kwargs):
+        start = datetime.datetime.now()
+
+        if len(cast_members) == 1:
+            raise CommandError("Give at least two cast members to merge")
+
+        if cast_members:
+            ids = [self.get_cast_member_id(value) for value in cast_members]
+            merges = {ids[0]: ids[1:]}
+        else:
+            merges = {ids[0]: ids[1:] for ids in find_duplicates()}
+
+        names = dict(CastMember.objects.values_list("id", "name"))
+        for target_id, source_ids in merges.items():
+            sources = ", ".join(f"{names[id]!r} ({id})" for id in source_ids)
+            print(f"Merging {sources} into {names[target_id]!r} ({target_id})")
+
+        if not merges:
+            print("Nothing to merge")
+        elif not dry_run:
+            moved = merge_cast_members(merges)
+            print(f"Moved {moved} lines")
+
+        print(f"Total time: {datetime.datetime.now() - start}")
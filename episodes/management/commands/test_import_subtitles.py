@@ -1,4 +1,11 @@
-from .import_subtitles import Command as ImportSubtitles
+import io
+
+from episodes.vtt import Cue, read_cues
+from episodes.management.commands.import_subtitles import (
+  Command as ImportSubtitles,
+  join_captions,
+  parse_episode,
+)
 
 def test_get_speakers():
   importsub = ImportSubtitles()
@@ -12,3 +19,50 @@ def test_get_speakers():
   assert importsub.get_speakers('LIAM, LAURA, MATTHEW and ASHLEY') == ['LIAM', 'LAURA', 'MATTHEW', 'ASHLEY']
   assert importsub.get_speakers('SCARY VOICE OVER') == ['SCARY VOICE OVER']
   assert importsub.get_speakers('SCARY VOICE OVER, SAM') == ['SCARY VOICE OVER', 'SAM']
+
+
+SAMPLE_VTT = '''WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.560 --> 00:00:01.393
+MATT: Hello everyone,
+
+00:00:01.393 --> 00:00:02.990
+and welcome to tonight's episode of Critical Role,
+
+00:00:02.990 --> 00:00:04.370
+(laughter)
+
+00:00:04.370 --> 00:00:06.206
+LIAM: Hi there.
+SAM: Hello.
+'''
+
+
+def test_join_captions():
+  cues = list(read_cues(io.StringIO(SAMPLE_VTT)))
+
+  assert cues[0] == Cue(560, 1393, ('MATT: Hello everyone,',))
+  assert len(cues) == 4
+
+  assert list(join_captions(cues)) == [
+    {
+      'start': 560,
+      'end': 2990,
+      'lines': ['MATT: Hello everyone,', "and welcome to tonight's episode of Critical Role,"],
+      'speakers': ['MATT'],
+    },
+    {'start': 4370, 'end': 5288, 'lines': ['LIAM: Hi there.'], 'speakers': ['LIAM']},
+    {'start': 5288, 'end': 6206, 'lines': ['SAM: Hello.'], 'speakers': ['SAM']},
+  ]
+
+
+def test_parse_episode(tmp_path):
+  (tmp_path / 'episode.vtt').write_text(SAMPLE_VTT)
+  parsed = parse_episode(str(tmp_path), {'chapter': '1', 'filename': 'episode.vtt'})
+
+  assert parsed['raw_captions'] == SAMPLE_VTT
+  assert len(parsed['captions']) == 3
+  assert parsed['profile']['counters'] == {'cues': 4, 'captions': 3}
+  assert set(parsed['profile']['timings']) == {'file_read', 'vtt_parse', 'speaker_join'}
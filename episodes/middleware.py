@@ -0,0 +1,189 @@
+import contextlib
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from episodes.instrumentation import (
+    RequestMetrics,
+    current_metrics,
+    logger,
+    record_query,
+    stats,
+)
+from episodes.models import CorpusState
+
+CACHED_CONTENT_TYPES = ("application/json",)
+
+
+class CorpusCacheMiddleware:
+    """
+    Caches anonymous GET responses from the API until the corpus changes.
+    Entries are keyed on `CorpusState`'s generation, so bumping it
+    invalidates all of them at once, and a hit skips both the queries
+    and the serialization.
+
+    Responses also get an ETag and Last-Modified derived from the
+    generation, so clients revalidating get a 304 without the view
+    running at all.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_cacheable(self, request):
+        return (
+            request.method in ("GET", "HEAD")
+            and request.path.startswith(settings.CORPUS_CACHE_PATH_PREFIX)
+            and "HTTP_AUTHORIZATION" not in request.META
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def get_cache_key(self, request, generation):
+        # Renderers are picked from the Accept header, and paginated
+        # responses link to the next page with the request's host and scheme
+        url = request.build_absolute_uri()
+        accept = request.META.get("HTTP_ACCEPT", "")
+        digest = hashlib.md5(f"{url}\n{accept}".encode()).hexdigest()
+        return f"corpus.{generation}.{digest}"
+
+    def __call__(self, request):
+        if not self.is_cacheable(request):
+            return self.get_response(request)
+
+        generation, updated = CorpusState.current()
+        key = self.get_cache_key(request, generation)
+        etag = f'"{key}"'
+        last_modified = int(updated.timestamp()) if updated else None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+
+        entry = cache.get(key)
+        if entry is not None:
+            status, content_type, content = entry
+            response = HttpResponse(content, status=status, content_type=content_type)
+        else:
+            response = self.get_response(request)
+            if self.should_store(request, response):
+                cache.set(
+                    key,
+                    (response.status_code, response["Content-Type"], response.content),
+                )
+
+        if response.status_code == 200:
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            patch_vary_headers(response, ("Accept",))
+
+        return response
+
+    def should_store(self, request, response):
+        return (
+            request.method == "GET"
+            and response.status_code == 200
+            and not response.streaming
+            and response.get("Content-Type", "").startswith(CACHED_CONTENT_TYPES)
+        )
+
+
+class InstrumentationMiddleware:
+    """
+    Measures every request (see episodes.instrumentation) and reports it
+    in a Server-Timing header:
+
+        db         time spent in SQL, and the number of queries
+        serialize  time in the view outside of SQL
+        render     time rendering the response
+        total
+
+    Requests slower than SLOW_REQUEST_THRESHOLD milliseconds are logged
+    with their slowest queries, and every request is added to the
+    histograms at /api/instrumentation/. Goes first in MIDDLEWARE, and
+    is only enabled with INSTRUMENT_REQUESTS = True.
+    """
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENT_REQUESTS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        if metrics.view_start is not None and "serialize" not in metrics.phases:
+            # Not a DRF response, the view returned it fully rendered
+            self.end_view(metrics)
+
+        total = metrics.total
+        response["Server-Timing"] = metrics.server_timing(total)
+        self.record(request, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.view_start = time.perf_counter()
+            metrics.view_sql_start = metrics.sql_time
+
+    def process_template_response(self, request, response):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.view_start is None:
+            return response
+
+        # DRF responses are rendered right after this hook
+        self.end_view(metrics)
+        render_start = time.perf_counter()
+        response.add_post_render_callback(
+            lambda response: metrics.add("render", time.perf_counter() - render_start)
+        )
+        return response
+
+    def end_view(self, metrics):
+        view_time = time.perf_counter() - metrics.view_start
+        view_sql_time = metrics.sql_time - metrics.view_sql_start
+        metrics.add("serialize", max(0.0, view_time - view_sql_time))
+
+    def record(self, request, metrics, total):
+        view = request.resolver_match.view_name if request.resolver_match else None
+        stats.add(
+            view or "unresolved",
+            {
+                "total": total * 1000,
+                "db": metrics.sql_time * 1000,
+                "queries": metrics.queries,
+                **{phase: duration * 1000 for phase, duration in metrics.phases.items()},
+            },
+        )
+
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                "Slow request: %s %s took %.0fms, %d queries in %.0fms\n%s",
+                request.method,
+                request.get_full_path(),
+                total * 1000,
+                metrics.queries,
+                metrics.sql_time * 1000,
+                "\n".join(
+                    f"  {duration * 1000:.1f}ms {sql}"
+                    for duration, sql in metrics.slowest_queries
+                ),
+            )
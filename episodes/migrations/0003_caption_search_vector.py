@@ -0,0 +1,28 @@
+# Generated by Django 3.2.3 on 2026-10-17 10:02
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0002_caption_section'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='caption',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Full-text search document'),
+        ),
+        migrations.RunSQL(
+            "UPDATE episodes_caption SET search_vector = to_tsvector('english', text)",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='caption',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='caption_search_vector_gin'),
+        ),
+    ]
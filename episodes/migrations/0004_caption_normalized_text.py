@@ -0,0 +1,43 @@
+# Generated by Django 3.2.3 on 2026-10-17 11:40
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from episodes.text import normalize_text
+
+
+def fill_normalized_text(apps, schema_editor):
+    Caption = apps.get_model('episodes', 'Caption')
+    batch = []
+
+    for caption in Caption.objects.only('id', 'text').iterator(chunk_size=5000):
+        caption.normalized_text = normalize_text(caption.text)
+        batch.append(caption)
+
+        if len(batch) == 5000:
+            Caption.objects.bulk_update(batch, ['normalized_text'])
+            batch = []
+
+    Caption.objects.bulk_update(batch, ['normalized_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0003_caption_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='caption',
+            name='normalized_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Lowercased caption text without punctuation'),
+        ),
+        migrations.RunPython(fill_normalized_text, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='caption',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['normalized_text'], name='caption_normalized_trgm_gin', opclasses=['gin_trgm_ops']),
+        ),
+    ]
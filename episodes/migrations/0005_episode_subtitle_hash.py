@@ -0,0 +1,39 @@
+# Generated by Django 3.2.3 on 2026-10-17 13:15
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_subtitle_hash(apps, schema_editor):
+    Episode = apps.get_model('episodes', 'Episode')
+
+    for episode in Episode.objects.only('id', 'raw_captions'):
+        episode.subtitle_hash = hashlib.sha256(episode.raw_captions.encode('utf-8')).hexdigest()
+        episode.save(update_fields=['subtitle_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0004_caption_normalized_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='episode',
+            name='subtitle_hash',
+            field=models.TextField(blank=True, default='', verbose_name='SHA-256 of the subtitle file'),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='subtitle_mtime',
+            field=models.FloatField(blank=True, null=True, verbose_name='Subtitle file modification time'),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='subtitle_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Subtitle file size in bytes'),
+        ),
+        migrations.RunPython(fill_subtitle_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-17 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0005_episode_subtitle_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='caption',
+            name='sequence',
+            field=models.IntegerField(null=True, verbose_name='Position in the episode, starting at 0'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE episodes_caption
+            SET sequence = numbered.sequence
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY episode_id ORDER BY start, id) - 1 AS sequence
+                FROM episodes_caption
+            ) AS numbered
+            WHERE episodes_caption.id = numbered.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='caption',
+            index=models.Index(fields=['episode', 'sequence'], name='caption_episode_sequence'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-17 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0006_caption_sequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caption',
+            index=models.Index(fields=['episode', 'start', 'id'], name='caption_episode_start'),
+        ),
+    ]
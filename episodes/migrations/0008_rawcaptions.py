@@ -0,0 +1,50 @@
+# Generated by Django 3.2.3 on 2026-10-17 18:20
+
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compress_raw_captions(apps, schema_editor):
+    Episode = apps.get_model('episodes', 'Episode')
+    RawCaptions = apps.get_model('episodes', 'RawCaptions')
+
+    for episode in Episode.objects.only('id', 'raw_captions').iterator():
+        data = episode.raw_captions.encode('utf-8')
+        RawCaptions.objects.create(
+            episode=episode, compressed=zlib.compress(data, 9), size=len(data)
+        )
+
+
+def decompress_raw_captions(apps, schema_editor):
+    Episode = apps.get_model('episodes', 'Episode')
+    RawCaptions = apps.get_model('episodes', 'RawCaptions')
+
+    for raw in RawCaptions.objects.iterator():
+        Episode.objects.filter(id=raw.episode_id).update(
+            raw_captions=zlib.decompress(raw.compressed).decode('utf-8')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0007_caption_episode_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RawCaptions',
+            fields=[
+                ('episode', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='raw', serialize=False, to='episodes.episode')),
+                ('compressed', models.BinaryField(verbose_name='zlib-compressed caption file')),
+                ('size', models.IntegerField(verbose_name='Uncompressed size in bytes')),
+            ],
+        ),
+        migrations.RunPython(compress_raw_captions, decompress_raw_captions),
+        migrations.RemoveField(
+            model_name='episode',
+            name='raw_captions',
+        ),
+    ]
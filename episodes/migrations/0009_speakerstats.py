@@ -0,0 +1,53 @@
+# Generated by Django 3.2.3 on 2026-10-17 19:52
+
+from django.db import migrations, models
+
+CREATE_SPEAKER_STATS = r"""
+CREATE MATERIALIZED VIEW episodes_speakerstats AS
+SELECT
+    row_number() OVER (ORDER BY speakers.castmember_id, caption.episode_id, caption.section) AS id,
+    speakers.castmember_id,
+    caption.episode_id,
+    caption.section,
+    count(*) AS lines,
+    sum(
+        CASE WHEN btrim(caption.text) = '' THEN 0
+        ELSE array_length(regexp_split_to_array(btrim(caption.text), '\s+'), 1)
+        END
+    ) AS words,
+    sum(caption.duration) AS duration
+FROM episodes_caption caption
+JOIN episodes_caption_speakers speakers ON speakers.caption_id = caption.id
+GROUP BY speakers.castmember_id, caption.episode_id, caption.section;
+
+CREATE INDEX episodes_speakerstats_castmember ON episodes_speakerstats (castmember_id, episode_id);
+CREATE INDEX episodes_speakerstats_episode ON episodes_speakerstats (episode_id, castmember_id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0008_rawcaptions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeakerStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.TextField(null=True, verbose_name='Section identifier')),
+                ('lines', models.IntegerField(verbose_name='Number of captions')),
+                ('words', models.IntegerField(verbose_name='Number of words')),
+                ('duration', models.DurationField(verbose_name='Total caption length')),
+            ],
+            options={
+                'db_table': 'episodes_speakerstats',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(
+            CREATE_SPEAKER_STATS,
+            reverse_sql='DROP MATERIALIZED VIEW episodes_speakerstats',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.3 on 2026-10-17 20:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0009_speakerstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhraseCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phrase', models.TextField(verbose_name='Normalized phrase')),
+                ('length', models.PositiveSmallIntegerField(verbose_name='Number of words')),
+                ('count', models.PositiveIntegerField(verbose_name='Times said')),
+                ('castmember', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phrase_counts', to='episodes.castmember')),
+                ('episode', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='phrase_counts', to='episodes.episode')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='phrasecount',
+            index=models.Index(fields=['phrase', 'castmember'], name='phrasecount_phrase'),
+        ),
+        migrations.AddIndex(
+            model_name='phrasecount',
+            index=models.Index(condition=models.Q(('episode__isnull', True)), fields=['castmember', 'length', '-count'], name='phrasecount_top'),
+        ),
+    ]
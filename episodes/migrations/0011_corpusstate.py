@@ -0,0 +1,22 @@
+# Generated by Django 3.2.3 on 2026-10-17 20:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0010_phrasecount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorpusState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.3 on 2026-10-17 20:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from episodes.text import normalize_speaker_name
+
+
+def create_aliases(apps, schema_editor):
+    """
+    An alias for every existing cast member name. When several names
+    normalize the same way the oldest cast member gets it, the others
+    can be merged into it with `./manage.py merge_cast_members`.
+    """
+    CastMember = apps.get_model('episodes', 'CastMember')
+    CastMemberAlias = apps.get_model('episodes', 'CastMemberAlias')
+
+    aliases = {}
+    for cast_member_id, name in CastMember.objects.order_by('-id').values_list('id', 'name'):
+        aliases[normalize_speaker_name(name)] = cast_member_id
+
+    CastMemberAlias.objects.bulk_create(
+        CastMemberAlias(alias=alias, castmember_id=cast_member_id)
+        for alias, cast_member_id in aliases.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0011_corpusstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CastMemberAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.TextField(unique=True, verbose_name='Normalized speaker name')),
+                ('castmember', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='episodes.castmember')),
+            ],
+            options={
+                'verbose_name_plural': 'cast member aliases',
+            },
+        ),
+        migrations.RunPython(create_aliases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 3.2.3 on 2026-10-17 20:51
+
+import importlib
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The stats view reads caption durations, so it's dropped while the
+# columns change and created again from the new ones
+speakerstats_0009 = importlib.import_module('episodes.migrations.0009_speakerstats')
+
+CREATE_SPEAKER_STATS = r"""
+CREATE MATERIALIZED VIEW episodes_speakerstats AS
+SELECT
+    row_number() OVER (ORDER BY speakers.castmember_id, caption.episode_id, caption.section) AS id,
+    speakers.castmember_id,
+    caption.episode_id,
+    caption.section,
+    count(*) AS lines,
+    sum(
+        CASE WHEN btrim(caption.text) = '' THEN 0
+        ELSE array_length(regexp_split_to_array(btrim(caption.text), '\s+'), 1)
+        END
+    ) AS words,
+    sum(caption.end_ms - caption.start_ms) * interval '1 millisecond' AS duration
+FROM episodes_caption caption
+JOIN episodes_caption_speakers speakers ON speakers.caption_id = caption.id
+GROUP BY speakers.castmember_id, caption.episode_id, caption.section;
+
+CREATE INDEX episodes_speakerstats_castmember ON episodes_speakerstats (castmember_id, episode_id);
+CREATE INDEX episodes_speakerstats_episode ON episodes_speakerstats (episode_id, castmember_id);
+"""
+
+DROP_SPEAKER_STATS = 'DROP MATERIALIZED VIEW episodes_speakerstats'
+
+# `text` used to be the lines joined with spaces
+TO_MILLISECONDS = r"""
+UPDATE episodes_caption SET
+    start_ms = round(extract(epoch FROM start) * 1000),
+    end_ms = round(extract(epoch FROM "end") * 1000),
+    text = array_to_string(lines, E'\n')
+"""
+
+FROM_MILLISECONDS = r"""
+UPDATE episodes_caption SET
+    start = start_ms * interval '1 millisecond',
+    "end" = end_ms * interval '1 millisecond',
+    duration = (end_ms - start_ms) * interval '1 millisecond',
+    lines = string_to_array(text, E'\n'),
+    text = replace(text, E'\n', ' ')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0012_castmemberalias'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_SPEAKER_STATS, reverse_sql=speakerstats_0009.CREATE_SPEAKER_STATS),
+        migrations.AddField(
+            model_name='caption',
+            name='start_ms',
+            field=models.IntegerField(null=True, verbose_name='Line start, in milliseconds'),
+        ),
+        migrations.AddField(
+            model_name='caption',
+            name='end_ms',
+            field=models.IntegerField(null=True, verbose_name='Line end, in milliseconds'),
+        ),
+        migrations.AlterField(
+            model_name='caption',
+            name='duration',
+            field=models.DurationField(null=True, verbose_name='Line length in time'),
+        ),
+        migrations.AlterField(
+            model_name='caption',
+            name='start',
+            field=models.DurationField(null=True, verbose_name='Line start timestamp'),
+        ),
+        migrations.AlterField(
+            model_name='caption',
+            name='end',
+            field=models.DurationField(null=True, verbose_name='Line end timestamp'),
+        ),
+        migrations.AlterField(
+            model_name='caption',
+            name='lines',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), null=True, size=None),
+        ),
+        migrations.RunSQL(TO_MILLISECONDS, reverse_sql=FROM_MILLISECONDS),
+        migrations.AlterField(
+            model_name='caption',
+            name='start_ms',
+            field=models.IntegerField(verbose_name='Line start, in milliseconds'),
+        ),
+        migrations.AlterField(
+            model_name='caption',
+            name='end_ms',
+            field=models.IntegerField(verbose_name='Line end, in milliseconds'),
+        ),
+        migrations.RemoveIndex(
+            model_name='caption',
+            name='caption_episode_start',
+        ),
+        migrations.RemoveField(
+            model_name='caption',
+            name='duration',
+        ),
+        migrations.RemoveField(
+            model_name='caption',
+            name='start',
+        ),
+        migrations.RemoveField(
+            model_name='caption',
+            name='end',
+        ),
+        migrations.RemoveField(
+            model_name='caption',
+            name='lines',
+        ),
+        migrations.AlterField(
+            model_name='caption',
+            name='text',
+            field=models.TextField(verbose_name='Caption text, one line per subtitle line'),
+        ),
+        migrations.AlterField(
+            model_name='caption',
+            name='episode',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='captions', to='episodes.episode'),
+        ),
+        migrations.AddIndex(
+            model_name='caption',
+            index=models.Index(fields=['episode', 'start_ms', 'id'], name='caption_episode_start_ms'),
+        ),
+        migrations.RunSQL(CREATE_SPEAKER_STATS, reverse_sql=DROP_SPEAKER_STATS),
+    ]
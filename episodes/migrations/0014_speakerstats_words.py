@@ -0,0 +1,52 @@
+# Generated by Django 3.2.3 on 2026-10-17 21:07
+
+import importlib
+
+from django.db import migrations
+
+caption_milliseconds_0013 = importlib.import_module('episodes.migrations.0013_caption_milliseconds')
+
+# Words are counted without the "MATT:" / "LAURA and SAM:" label captions
+# start with, same pattern as episodes.text.SPEAKERS_PATTERN
+CREATE_SPEAKER_STATS = r"""
+CREATE MATERIALIZED VIEW episodes_speakerstats AS
+SELECT
+    row_number() OVER (ORDER BY speakers.castmember_id, caption.episode_id, caption.section) AS id,
+    speakers.castmember_id,
+    caption.episode_id,
+    caption.section,
+    count(*) AS lines,
+    sum(
+        CASE WHEN caption.words = '' THEN 0
+        ELSE array_length(regexp_split_to_array(caption.words, '\s+'), 1)
+        END
+    ) AS words,
+    sum(caption.end_ms - caption.start_ms) * interval '1 millisecond' AS duration
+FROM (
+    SELECT
+        id, episode_id, section, start_ms, end_ms,
+        btrim(regexp_replace(text, '^[A-Z][A-Z().,'' ]*(?:and [A-Z]+)?:', '')) AS words
+    FROM episodes_caption
+) caption
+JOIN episodes_caption_speakers speakers ON speakers.caption_id = caption.id
+GROUP BY speakers.castmember_id, caption.episode_id, caption.section;
+
+CREATE INDEX episodes_speakerstats_castmember ON episodes_speakerstats (castmember_id, episode_id);
+CREATE INDEX episodes_speakerstats_episode ON episodes_speakerstats (episode_id, castmember_id);
+"""
+
+DROP_SPEAKER_STATS = caption_milliseconds_0013.DROP_SPEAKER_STATS
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0013_caption_milliseconds'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [DROP_SPEAKER_STATS, CREATE_SPEAKER_STATS],
+            reverse_sql=[DROP_SPEAKER_STATS, caption_milliseconds_0013.CREATE_SPEAKER_STATS],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-17 21:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('episodes', '0014_speakerstats_words'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caption',
+            index=models.Index(fields=['section', 'episode', 'start_ms', 'id'], name='caption_section_start'),
+        ),
+    ]
@@ -1,15 +1,32 @@
+import codecs
 import json
 import datetime
+import hashlib
+import zlib
+from pathlib import Path
 from urllib.parse import urlencode
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from episodes.sections import detect_sections, section_ranges
+from episodes.text import normalize_speaker_name, normalize_text
 
 YOUTUBE_VIDEO_URL_PREFIX = "https://www.youtube.com/watch?"
 YOUTUBE_EMBED_URL_PREFIX = "https://www.youtube.com/embed/"
-SECTIONS_FILE_PATH = "episodes/management/commands/sections.json"
+SECTIONS_FILE_PATH = Path(__file__).parent / "management/commands/sections.json"
+SEARCH_CONFIG = "english"
+# Captions keep their subtitle lines in `text`, separated by newlines
+LINE_SEPARATOR = "\n"
 
 
 ## Episode sections
+# Detected from these cues in episodes/sections.py
 # Intro & announcements
 #   Starts counting from the beginning of the episode
 # First part
@@ -26,7 +43,15 @@ class Episode(models.Model):
     title = models.TextField(verbose_name="Episode title")
     # running_time = models.DurationField(verbose_name="Episode running time")
     subtitle_filename = models.TextField(verbose_name="Episode subtitle file name")
-    raw_captions = models.TextField(verbose_name="Raw caption contents")
+    subtitle_hash = models.TextField(
+        verbose_name="SHA-256 of the subtitle file", blank=True, default=""
+    )
+    subtitle_mtime = models.FloatField(
+        verbose_name="Subtitle file modification time", blank=True, null=True
+    )
+    subtitle_size = models.BigIntegerField(
+        verbose_name="Subtitle file size in bytes", blank=True, null=True
+    )
 
     @property
     def watch_url(self):
@@ -36,14 +61,76 @@ class Episode(models.Model):
     def embed_url(self):
         return YOUTUBE_EMBED_URL_PREFIX + self.video_id + "?"
 
+    @staticmethod
+    def hash_subtitles(raw_captions):
+        return hashlib.sha256(raw_captions.encode("utf-8")).hexdigest()
+
+    @property
+    def raw_captions(self):
+        """
+        The whole subtitle file. This hits the database and decompresses
+        it every time, see `RawCaptions`.
+        """
+        return self.raw.text
+
     @property
     def full_text(self):
-        return " ".join(self.captions.values_list("text", flat=True))
+        return " ".join(
+            Caption.display_text(text) for text in self.captions.values_list("text", flat=True)
+        )
 
     def __str__(self):
         return f"{self.chapter} - {self.title}"
 
 
+class RawCaptions(models.Model):
+    """
+    An episode's subtitle file, zlib-compressed. It lives in its own table
+    so fetching episodes never drags hundreds of KB per row along.
+    """
+
+    episode = models.OneToOneField(
+        "episodes.Episode",
+        primary_key=True,
+        related_name="raw",
+        on_delete=models.CASCADE,
+    )
+    compressed = models.BinaryField(verbose_name="zlib-compressed caption file")
+    size = models.IntegerField(verbose_name="Uncompressed size in bytes")
+
+    @staticmethod
+    def compress(text):
+        return zlib.compress(text.encode("utf-8"), 9)
+
+    @classmethod
+    def store(cls, episode, text):
+        cls.objects.update_or_create(
+            episode=episode,
+            defaults=dict(
+                compressed=cls.compress(text), size=len(text.encode("utf-8"))
+            ),
+        )
+
+    def iter_text(self, chunk_size=64 * 1024):
+        """
+        Decompresses the file `chunk_size` compressed bytes at a time.
+        """
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        compressed = bytes(self.compressed)
+
+        for offset in range(0, len(compressed), chunk_size):
+            chunk = decompressor.decompress(compressed[offset : offset + chunk_size])
+            if text := decoder.decode(chunk):
+                yield text
+
+        yield decoder.decode(decompressor.flush(), final=True)
+
+    @property
+    def text(self):
+        return "".join(self.iter_text())
+
+
 class CastMember(models.Model):
     name = models.TextField(verbose_name="Cast member name")
 
@@ -51,31 +138,136 @@ class CastMember(models.Model):
         return f"{self.name}"
 
 
+class CastMemberAlias(models.Model):
+    """
+    A way the subtitles spell a cast member's name ("MATT", "MATTHEW"),
+    normalized with `normalize_speaker_name`. Each alias belongs to a
+    single cast member, so every spelling of a name resolves to the same
+    row. See episodes/cast.py.
+    """
+
+    alias = models.TextField(verbose_name="Normalized speaker name", unique=True)
+    castmember = models.ForeignKey(
+        "episodes.CastMember", related_name="aliases", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        verbose_name_plural = "cast member aliases"
+
+    def __str__(self):
+        return f"{self.alias} -> {self.castmember_id}"
+
+    @staticmethod
+    def castmember_id(name):
+        """
+        Subquery for the id of the cast member called `name`, to filter
+        on instead of joining cast member names.
+        """
+        return CastMemberAlias.objects.filter(
+            alias=normalize_speaker_name(name)
+        ).values("castmember_id")
+
+
 class Caption(models.Model):
+    # Indexed by the (episode, ...) indexes below
     episode = models.ForeignKey(
-        "episodes.Episode", related_name="captions", on_delete=models.CASCADE
+        "episodes.Episode",
+        related_name="captions",
+        on_delete=models.CASCADE,
+        db_index=False,
     )
     speakers = models.ManyToManyField("episodes.CastMember", related_name="lines")
-    duration = models.DurationField(verbose_name="Line length in time")
-    start = models.DurationField(verbose_name="Line start timestamp")
-    end = models.DurationField(verbose_name="Line end timestamp")
+    sequence = models.IntegerField(
+        verbose_name="Position in the episode, starting at 0", null=True
+    )
+    start_ms = models.IntegerField(verbose_name="Line start, in milliseconds")
+    end_ms = models.IntegerField(verbose_name="Line end, in milliseconds")
     section = models.TextField(verbose_name="Section identifier", blank=True, null=True)
-    text = models.TextField(verbose_name="Caption text")
-    lines = ArrayField(models.TextField(name="line"))
+    text = models.TextField(verbose_name="Caption text, one line per subtitle line")
+    normalized_text = models.TextField(
+        verbose_name="Lowercased caption text without punctuation",
+        blank=True,
+        default="",
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name="Full-text search document", null=True, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="caption_search_vector_gin"),
+            GinIndex(
+                fields=["normalized_text"],
+                name="caption_normalized_trgm_gin",
+                opclasses=["gin_trgm_ops"],
+            ),
+            models.Index(fields=["episode", "sequence"], name="caption_episode_sequence"),
+            models.Index(
+                fields=["episode", "start_ms", "id"], name="caption_episode_start_ms"
+            ),
+            # Section filters in the admin, in the same order as its list
+            models.Index(
+                fields=["section", "episode", "start_ms", "id"],
+                name="caption_section_start",
+            ),
+        ]
+
+    @staticmethod
+    def join_lines(lines):
+        return LINE_SEPARATOR.join(lines)
+
+    @staticmethod
+    def display_text(text):
+        """
+        `text` on a single line, the way the API has always shown it.
+        """
+        return text.replace(LINE_SEPARATOR, " ")
+
+    @property
+    def lines(self):
+        return self.text.split(LINE_SEPARATOR)
+
+    @property
+    def start(self):
+        return datetime.timedelta(milliseconds=self.start_ms)
+
+    @property
+    def end(self):
+        return datetime.timedelta(milliseconds=self.end_ms)
+
+    @property
+    def duration(self):
+        return datetime.timedelta(milliseconds=self.end_ms - self.start_ms)
 
     @property
     def previous(self):
-        return (
-            self.episode.captions.filter(start__lt=self.start)
-            .order_by("-start")
-            .first()
-        )
+        if self.sequence is None:
+            return None
+        return Caption.objects.filter(
+            episode_id=self.episode_id, sequence=self.sequence - 1
+        ).first()
 
     @property
     def next(self):
-        return (
-            self.episode.captions.filter(start__gt=self.start).order_by("start").first()
-        )
+        if self.sequence is None:
+            return None
+        return Caption.objects.filter(
+            episode_id=self.episode_id, sequence=self.sequence + 1
+        ).first()
+
+    def context(self, before=5, after=5):
+        """
+        This caption and the ones around it, in order. Captions added
+        outside an import have no `sequence` and only return themselves.
+        """
+        if self.sequence is None:
+            return Caption.objects.filter(pk=self.pk)
+        return Caption.objects.filter(
+            episode_id=self.episode_id,
+            sequence__gte=self.sequence - before,
+            sequence__lte=self.sequence + after,
+        ).order_by("sequence")
 
     @property
     def url(self):
@@ -116,19 +308,112 @@ class Caption(models.Model):
     def __str__(self):
         return f"[{self.start_ts}-{self.end_ts}] {self.text[:30]}..."
 
+    def save(self, *args, **kwargs):
+        """
+        Keeps `normalized_text` and `search_vector` in sync with the text
+        for captions saved one at a time (API and admin edits). Imports
+        fill both in bulk instead.
+        """
+        update_fields = kwargs.get("update_fields")
+        text_changed = update_fields is None or "text" in update_fields
+        if text_changed:
+            self.normalized_text = normalize_text(self.text)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "normalized_text"}
+
+        super().save(*args, **kwargs)
+
+        if text_changed:
+            Caption.update_search_vectors(Caption.objects.filter(pk=self.pk))
+
     @staticmethod
-    def apply_sections():
+    def update_search_vectors(captions):
+        """
+        Fills `search_vector` for the given caption queryset. Done in
+        a single UPDATE so Postgres builds the documents itself.
+        """
+        return captions.update(search_vector=SearchVector("text", config=SEARCH_CONFIG))
+
+    @staticmethod
+    def load_section_overrides():
+        """
+        Manual section starts from sections.json, as
+        {chapter: {section: milliseconds}}.
+        """
         with open(SECTIONS_FILE_PATH) as f:
             section_data = json.load(f)
 
-        for episode_id, sections in section_data.items():
-            episode = Episode.objects.get(id=episode_id)
-            for section, timestamp in sections.items():
-                if not timestamp:
-                    continue
-                episode.captions.filter(
-                    start=Caption._from_timestamp(timestamp)
-                ).update(section=section)
+        return {
+            int(chapter): {
+                section: Caption._from_timestamp(timestamp)
+                // datetime.timedelta(milliseconds=1)
+                for section, timestamp in sections.items()
+                if timestamp
+            }
+            for chapter, sections in section_data.items()
+        }
+
+    @staticmethod
+    def speaker_array(field="castmember_id"):
+        """
+        Subquery for a caption's speakers as a sorted array of `field`,
+        "castmember_id" or "castmember__name". Lets caption rows carry
+        their speakers without prefetching them; None without speakers.
+        """
+        base_field = (
+            models.IntegerField() if field == "castmember_id" else models.TextField()
+        )
+        return Subquery(
+            Caption.speakers.through.objects.filter(caption_id=OuterRef("pk"))
+            .order_by()
+            .values("caption_id")
+            .annotate(speakers=ArrayAgg(field, ordering=field))
+            .values("speakers"),
+            output_field=ArrayField(base_field),
+        )
+
+    @staticmethod
+    def apply_sections(episodes=None, refresh_stats=True, overrides=None):
+        """
+        Detects the sections of each episode (all of them by default) and
+        tags every caption with the section it belongs to. Starts set in
+        sections.json win over the detected ones; pass them as `overrides`
+        (see `load_section_overrides`) to avoid reading the file again.
+
+        Reads each episode's captions once and writes them with one
+        UPDATE per section.
+        """
+        if overrides is None:
+            overrides = Caption.load_section_overrides()
+
+        if episodes is None:
+            episodes = Episode.objects.all()
+
+        for episode in episodes:
+            captions = Caption.objects.filter(episode=episode)
+            rows = (
+                captions.order_by("sequence")
+                .values_list(
+                    "sequence",
+                    "start_ms",
+                    "normalized_text",
+                    Caption.speaker_array("castmember__name"),
+                )
+                .iterator()
+            )
+            boundaries = detect_sections(rows, overrides.get(episode.chapter))
+
+            with transaction.atomic():
+                captions.update(section=None)
+                for section, first, last in section_ranges(boundaries):
+                    in_range = captions.filter(sequence__gte=first)
+                    if last is not None:
+                        in_range = in_range.filter(sequence__lt=last)
+                    in_range.update(section=section)
+
+        if refresh_stats:
+            SpeakerStats.refresh()
+            CorpusState.bump()
 
     def identify(self, section_type):
         """
@@ -141,7 +426,200 @@ class Caption(models.Model):
         with open(SECTIONS_FILE_PATH) as f:
             sections = json.load(f)
 
-        sections[str(self.episode.chapter)][section_type] = self.start_ts
+        sections.setdefault(str(self.episode.chapter), {})[section_type] = self.start_ts
 
         with open(SECTIONS_FILE_PATH, "w") as f:
             json.dump(sections, f, indent=2)
+
+
+class SpeakerStats(models.Model):
+    """
+    Lines, words and talk time per cast member, episode and section,
+    backed by a materialized view (see migration 0009). A caption with
+    several speakers counts for each of them. Call `refresh` after
+    captions or sections change.
+    """
+
+    castmember = models.ForeignKey(
+        "episodes.CastMember", related_name="stats", on_delete=models.DO_NOTHING
+    )
+    episode = models.ForeignKey(
+        "episodes.Episode", related_name="speaker_stats", on_delete=models.DO_NOTHING
+    )
+    section = models.TextField(verbose_name="Section identifier", null=True)
+    lines = models.IntegerField(verbose_name="Number of captions")
+    words = models.IntegerField(verbose_name="Number of words")
+    duration = models.DurationField(verbose_name="Total caption length")
+
+    class Meta:
+        managed = False
+        db_table = "episodes_speakerstats"
+
+    @staticmethod
+    def refresh():
+        """
+        Recomputes the view. This locks it for the second or so it takes,
+        reads wait for it rather than failing.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW {SpeakerStats._meta.db_table}")
+
+
+class PhraseCount(models.Model):
+    """
+    How many times a cast member said a phrase (1 to 4 words of
+    normalized text) in an episode. Rows without an episode hold the
+    cast member's totals over every episode, see `refresh_totals`.
+    Built by episodes.phrases.
+    """
+
+    phrase = models.TextField(verbose_name="Normalized phrase")
+    length = models.PositiveSmallIntegerField(verbose_name="Number of words")
+    castmember = models.ForeignKey(
+        "episodes.CastMember", related_name="phrase_counts", on_delete=models.CASCADE
+    )
+    episode = models.ForeignKey(
+        "episodes.Episode",
+        related_name="phrase_counts",
+        on_delete=models.CASCADE,
+        null=True,
+    )
+    count = models.PositiveIntegerField(verbose_name="Times said")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["phrase", "castmember"], name="phrasecount_phrase"),
+            models.Index(
+                fields=["castmember", "length", "-count"],
+                name="phrasecount_top",
+                condition=models.Q(episode__isnull=True),
+            ),
+        ]
+
+    @staticmethod
+    def refresh_totals():
+        """
+        Recomputes the per cast member totals from the episode counts.
+        """
+        table = PhraseCount._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE episode_id IS NULL")
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (phrase, length, castmember_id, episode_id, count)
+                SELECT phrase, length, castmember_id, NULL, sum(count)
+                FROM {table}
+                GROUP BY phrase, length, castmember_id
+                """
+            )
+
+    @staticmethod
+    def remove_from_totals(episode):
+        """
+        Takes the episode's counts off the totals, dropping the totals
+        that reach zero. Together with `add_to_totals` this updates the
+        totals for an episode without going over every other one.
+        """
+        table = PhraseCount._meta.db_table
+        match = """
+            total.episode_id IS NULL
+            AND total.phrase = episode.phrase
+            AND total.length = episode.length
+            AND total.castmember_id = episode.castmember_id
+            AND episode.episode_id = %s
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {table} AS total
+                USING {table} AS episode
+                WHERE {match} AND total.count <= episode.count
+                """,
+                [episode.pk],
+            )
+            cursor.execute(
+                f"""
+                UPDATE {table} AS total
+                SET count = total.count - episode.count
+                FROM {table} AS episode
+                WHERE {match}
+                """,
+                [episode.pk],
+            )
+
+    @staticmethod
+    def add_to_totals(episode):
+        """
+        Adds the episode's counts to the totals, see `remove_from_totals`.
+        """
+        table = PhraseCount._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS total
+                SET count = total.count + episode.count
+                FROM {table} AS episode
+                WHERE total.episode_id IS NULL
+                AND total.phrase = episode.phrase
+                AND total.length = episode.length
+                AND total.castmember_id = episode.castmember_id
+                AND episode.episode_id = %s
+                """,
+                [episode.pk],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (phrase, length, castmember_id, episode_id, count)
+                SELECT phrase, length, castmember_id, NULL, count
+                FROM {table} AS episode
+                WHERE episode.episode_id = %s
+                AND NOT EXISTS (
+                    SELECT 1 FROM {table} AS total
+                    WHERE total.episode_id IS NULL
+                    AND total.phrase = episode.phrase
+                    AND total.length = episode.length
+                    AND total.castmember_id = episode.castmember_id
+                )
+                """,
+                [episode.pk],
+            )
+
+
+class CorpusState(models.Model):
+    """
+    A single row counting changes to the corpus. Anything that changes
+    captions, sections or the data derived from them calls `bump`,
+    which invalidates every cached API response (see middleware.py).
+    """
+
+    CACHE_KEY = "corpus-state"
+
+    generation = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def current(cls):
+        """
+        (generation, updated), read from the cache when possible so
+        cached responses can be served without a query. Other processes
+        see a bump once their cached copy expires, after at most
+        CORPUS_STATE_TIMEOUT seconds with a per-process cache.
+        """
+        state = cache.get(cls.CACHE_KEY)
+        if state is None:
+            state = cls.objects.filter(pk=1).values_list(
+                "generation", "updated"
+            ).first() or (0, None)
+            cache.set(cls.CACHE_KEY, state, settings.CORPUS_STATE_TIMEOUT)
+
+        return state
+
+    @classmethod
+    def bump(cls):
+        updated = cls.objects.filter(pk=1).update(
+            generation=F("generation") + 1, updated=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(pk=1, defaults={"generation": 1})
+
+        cache.delete(cls.CACHE_KEY)
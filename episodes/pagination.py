@@ -0,0 +1,151 @@
+import base64
+import binascii
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import BooleanField, F, Func, Value
+from django.utils.duration import duration_iso_string
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_value(row, name):
+    """
+    Rows are model instances, or dictionaries when the queryset
+    was built with `values()`.
+    """
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+class RowAfter(Func):
+    """
+    `(a, b, c) > (x, y, z)`, a row comparison Postgres answers with a
+    single seek in an index on (a, b, c).
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, names, values):
+        super().__init__(*[F(name) for name in names], *[Value(value) for value in values])
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls = []
+        params = []
+        for expression in self.source_expressions:
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+
+        half = len(sqls) // 2
+        return f"({', '.join(sqls[:half])}) > ({', '.join(sqls[half:])})", params
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination over a unique ordering, by default
+    the view's `keyset_ordering`. The cursor holds the ordering values
+    of the last row on the page, and the next page is fetched with
+
+        WHERE (a, b, c) > (last_a, last_b, last_c) ORDER BY a, b, c LIMIT n
+
+    so every page costs an index seek, however deep it is. Since the
+    cursor doesn't hold an offset, it keeps working with any filters.
+    """
+
+    ordering = ("id",)
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    @property
+    def page_size(self):
+        return api_settings.PAGE_SIZE
+
+    @property
+    def max_page_size(self):
+        return settings.MAX_PAGE_SIZE
+
+    def get_ordering(self, queryset, view):
+        return getattr(view, "keyset_ordering", self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        values = [
+            duration_iso_string(value) if hasattr(value, "total_seconds") else value
+            for value in values
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request, queryset, ordering):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            assert len(values) == len(ordering)
+            return [
+                queryset.model._meta.get_field(name).to_python(value)
+                for name, value in zip(ordering, values)
+            ]
+        except (binascii.Error, ValueError, ValidationError, AssertionError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def seek_filter(ordering, position):
+        """
+        `(a, b, c) > (x, y, z)`. Spelled out as an OR of comparisons,
+        Postgres would scan the index from its start instead.
+        """
+        return RowAfter(ordering, position)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = self.get_ordering(queryset, view)
+        position = self.decode_cursor(request, queryset, ordering)
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, position))
+
+        # One extra row tells us whether there's a next page
+        results = list(queryset[: page_size + 1])
+        page = results[:page_size]
+
+        self.request = request
+        self.next_cursor = None
+        if len(results) > page_size:
+            self.next_cursor = self.encode_cursor(
+                [get_value(page[-1], name) for name in ordering]
+            )
+
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
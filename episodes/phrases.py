@@ -0,0 +1,85 @@
+"""
+Phrase counts per cast member and episode, for questions like "how many
+times has MATT said 'roll for initiative'?". Phrases are counted within
+each caption, so the last words of one line and the first of the next
+never make up a phrase.
+"""
+from collections import Counter
+
+from django.db import transaction
+from episodes.models import Caption, PhraseCount
+from episodes.text import normalize_text, strip_speakers
+
+MAX_PHRASE_LENGTH = 4
+BATCH_SIZE = 5000
+
+
+def iter_phrases(words, max_length=MAX_PHRASE_LENGTH):
+    """
+    Yields (length, phrase) for every run of 1 to `max_length` words.
+    """
+    for length in range(1, max_length + 1):
+        for index in range(len(words) - length + 1):
+            yield length, " ".join(words[index : index + length])
+
+
+def count_phrases(captions, max_length=MAX_PHRASE_LENGTH):
+    """
+    `captions` is an iterable of (text, speaker_ids). Returns a Counter
+    of (castmember_id, length, phrase). A phrase said by several cast
+    members at once counts for each.
+    """
+    counts = Counter()
+
+    for text, speaker_ids in captions:
+        if not speaker_ids:
+            continue
+
+        words = normalize_text(strip_speakers(text)).split()
+        caption_counts = Counter(iter_phrases(words, max_length))
+
+        for speaker_id in set(speaker_ids):
+            for (length, phrase), count in caption_counts.items():
+                counts[speaker_id, length, phrase] += count
+
+    return counts
+
+
+def episode_captions(episode):
+    return (
+        Caption.objects.filter(episode=episode)
+        .values_list("text", Caption.speaker_array())
+        .iterator()
+    )
+
+
+@transaction.atomic
+def index_episode(episode, update_totals=True):
+    """
+    Replaces the episode's phrase counts and moves the totals by the
+    difference. When rebuilding many episodes, pass
+    `update_totals=False` and call `PhraseCount.refresh_totals` once
+    every episode is done.
+    """
+    if update_totals:
+        PhraseCount.remove_from_totals(episode)
+
+    PhraseCount.objects.filter(episode=episode).delete()
+    PhraseCount.objects.bulk_create(
+        (
+            PhraseCount(
+                phrase=phrase,
+                length=length,
+                castmember_id=castmember_id,
+                episode=episode,
+                count=count,
+            )
+            for (castmember_id, length, phrase), count in count_phrases(
+                episode_captions(episode)
+            ).items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    if update_totals:
+        PhraseCount.add_to_totals(episode)
@@ -0,0 +1,90 @@
+"""
+Phase timings and counters for the import pipeline, so it's clear where
+import time goes. Timers are plain dictionaries underneath and can be
+passed between processes.
+"""
+import contextlib
+import cProfile
+import os
+import time
+from collections import Counter, defaultdict
+
+
+class PhaseTimer:
+    def __init__(self, timings=None, counters=None):
+        self.timings = defaultdict(float, timings or {})
+        self.counters = Counter(counters or {})
+        # Time spent in nested phases, for each running phase
+        self.nested = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Adds the time spent in the block to `name`, in seconds. Time
+        spent in a phase nested in the block only counts for that phase.
+        """
+        start = time.perf_counter()
+        self.nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] += elapsed - self.nested.pop()
+            if self.nested:
+                self.nested[-1] += elapsed
+
+    def timed(self, name, iterable, counter=None):
+        """
+        Yields the items of `iterable`, adding the time spent producing
+        each one to `name` and counting them in `counter`. A generator
+        consumed by another phase is timed apart from it this way.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            if counter:
+                self.count(counter)
+            yield item
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["timings"], data["counters"])
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def update(self, other):
+        for name, seconds in other.timings.items():
+            self.timings[name] += seconds
+        self.counters.update(other.counters)
+
+    def as_dict(self):
+        return {
+            "timings": {name: round(seconds, 6) for name, seconds in self.timings.items()},
+            "counters": dict(self.counters),
+        }
+
+
+@contextlib.contextmanager
+def profiled(directory, name):
+    """
+    Profiles the block with cProfile and writes the stats to
+    `directory`/`name`.prof, for `python -m pstats` or snakeviz.
+    Does nothing when `directory` is None.
+    """
+    if directory is None:
+        yield
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(os.path.join(directory, f"{name}.prof"))
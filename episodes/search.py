@@ -0,0 +1,255 @@
+import copy
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import BooleanField, F, FloatField, Func, Value
+from episodes.models import SEARCH_CONFIG, Caption, CastMemberAlias
+from episodes.text import normalize_speaker_name, normalize_text
+
+# Full-text modes are passed straight to SearchQuery(search_type=...)
+#   plain      all words, in any order
+#   phrase     all words, in this order ("is it thursday my dudes")
+#   websearch  google-like syntax: "quoted phrases", or, -exclusions
+#   raw        tsquery syntax, e.g. "thursday & dudes"
+# and "fuzzy" uses trigram similarity against `Caption.normalized_text`.
+FULL_TEXT_MODES = ("plain", "phrase", "websearch", "raw")
+FUZZY_MODE = "fuzzy"
+SEARCH_MODES = FULL_TEXT_MODES + (FUZZY_MODE,)
+DEFAULT_SEARCH_MODE = "websearch"
+
+# Postgres' own default for pg_trgm.word_similarity_threshold
+DEFAULT_FUZZY_THRESHOLD = 0.6
+
+HEADLINE_START = "<mark>"
+HEADLINE_STOP = "</mark>"
+
+# Postgres functions behind SearchQuery's search types
+TSQUERY_FUNCTIONS = {
+    "plain": "plainto_tsquery",
+    "phrase": "phraseto_tsquery",
+    "websearch": "websearch_to_tsquery",
+    "raw": "to_tsquery",
+}
+
+# One row per phrase: its position in the batch, the query, and the
+# speaker / episode it's restricted to (NULL for any). Every phrase
+# gets its best `limit` hits from the lateral subquery.
+BATCH_SEARCH_SQL = """
+SELECT phrases.position, hit.id, hit.rank,
+       ts_headline(%s::regconfig, hit.text, hit.query, %s)
+FROM (VALUES {values}) AS phrases (position, phrase, speaker_id, episode_id)
+CROSS JOIN LATERAL (
+    SELECT caption.id, caption.text, query, ts_rank(caption.search_vector, query) AS rank
+    FROM {caption_table} caption
+    JOIN {episode_table} episode ON episode.id = caption.episode_id,
+         {tsquery_function}(%s::regconfig, phrases.phrase) query
+    WHERE caption.search_vector @@ query
+      AND (phrases.episode_id IS NULL OR caption.episode_id = phrases.episode_id)
+      AND (phrases.speaker_id IS NULL OR EXISTS (
+          SELECT 1 FROM {speakers_table} speakers
+          WHERE speakers.caption_id = caption.id
+            AND speakers.castmember_id = phrases.speaker_id
+      ))
+    ORDER BY rank DESC, episode.chapter, caption.start_ms
+    LIMIT %s
+) hit
+ORDER BY phrases.position, hit.rank DESC
+"""
+
+
+class WordSimilarity(Func):
+    """
+    How well `query` matches any part of `text`, between 0 and 1.
+    """
+
+    function = "WORD_SIMILARITY"
+    output_field = FloatField()
+
+
+class WordSimilar(Func):
+    """
+    `query <% text`, true when WordSimilarity is above
+    pg_trgm.word_similarity_threshold. Unlike filtering on
+    WordSimilarity directly, this can use the trigram index.
+    """
+
+    template = "%(expressions)s"
+    arg_joiner = " <%% "
+    output_field = BooleanField()
+
+
+def filter_captions(captions, speaker=None, episode=None, section=None):
+    """
+    Narrows down a caption queryset. `speaker` can be either a
+    cast member id or name, `episode` is an episode id.
+    """
+    if speaker:
+        if str(speaker).isdigit():
+            captions = captions.filter(speakers=speaker)
+        else:
+            captions = captions.filter(speakers__in=CastMemberAlias.castmember_id(speaker))
+
+    if episode:
+        captions = captions.filter(episode=episode)
+
+    if section:
+        captions = captions.filter(section=section)
+
+    return captions
+
+
+def full_text_search(query, mode=DEFAULT_SEARCH_MODE, speaker=None, episode=None):
+    """
+    Full-text search over `Caption.search_vector`. Results are annotated
+    with `rank` and a highlighted `headline`, best matches first.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type=mode)
+
+    captions = filter_captions(
+        Caption.objects.filter(search_vector=search_query),
+        speaker=speaker,
+        episode=episode,
+    )
+
+    return captions.annotate(
+        rank=SearchRank(F("search_vector"), search_query),
+        headline=SearchHeadline(
+            "text",
+            search_query,
+            config=SEARCH_CONFIG,
+            start_sel=HEADLINE_START,
+            stop_sel=HEADLINE_STOP,
+            highlight_all=True,
+        ),
+    ).order_by("-rank", "episode__chapter", "start_ms")
+
+
+def fuzzy_search(query, speaker=None, episode=None):
+    """
+    Typo-tolerant search over `Caption.normalized_text`, annotated with
+    the trigram similarity as `rank`. The caller is responsible for
+    setting pg_trgm.word_similarity_threshold, see `search_captions`.
+    """
+    query = Value(normalize_text(query))
+
+    captions = filter_captions(
+        Caption.objects.filter(WordSimilar(query, "normalized_text")),
+        speaker=speaker,
+        episode=episode,
+    )
+
+    return captions.annotate(
+        rank=WordSimilarity(query, "normalized_text"),
+        headline=F("text"),
+    ).order_by("-rank", "episode__chapter", "start_ms")
+
+
+def search_captions(
+    query,
+    mode=DEFAULT_SEARCH_MODE,
+    speaker=None,
+    episode=None,
+    limit=20,
+    threshold=DEFAULT_FUZZY_THRESHOLD,
+):
+    """
+    Returns up to `limit` captions matching `query`, best first.
+    `threshold` only applies to fuzzy searches.
+    """
+    if mode != FUZZY_MODE:
+        captions = full_text_search(query, mode, speaker=speaker, episode=episode)
+        return list(
+            captions.select_related("episode").prefetch_related("speakers")[:limit]
+        )
+
+    captions = fuzzy_search(query, speaker=speaker, episode=episode)
+
+    # The threshold is a setting rather than a query parameter, so it
+    # has to be set in the same transaction that runs the query.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                [str(threshold)],
+            )
+        return list(
+            captions.select_related("episode").prefetch_related("speakers")[:limit]
+        )
+
+
+def resolve_speakers(speakers):
+    """
+    Maps each speaker, a cast member id or name, to a cast member id
+    (None for unknown names), with a single query for all the names.
+    """
+    names = {
+        speaker: normalize_speaker_name(speaker)
+        for speaker in speakers
+        if not str(speaker).isdigit()
+    }
+    aliases = dict(
+        CastMemberAlias.objects.filter(alias__in=names.values()).values_list(
+            "alias", "castmember_id"
+        )
+    )
+
+    return {
+        speaker: int(speaker) if str(speaker).isdigit() else aliases.get(names[speaker])
+        for speaker in speakers
+    }
+
+
+def batch_search(phrases, mode=DEFAULT_SEARCH_MODE, limit=5):
+    """
+    Full-text search for many phrases at once, in a single statement.
+    `phrases` is a list of dictionaries with a `q`, and optionally a
+    `speaker` (id or name) and an `episode` id. Returns a list with the
+    best `limit` captions for each phrase, annotated with `rank` and
+    `headline` like `full_text_search`.
+    """
+    speaker_ids = resolve_speakers(
+        {phrase["speaker"] for phrase in phrases if phrase.get("speaker")}
+    )
+    params = []
+    values = []
+
+    for position, phrase in enumerate(phrases):
+        values.append("(%s::integer, %s::text, %s::integer, %s::integer)")
+        params += [
+            position,
+            phrase["q"],
+            # An unknown speaker matches nothing rather than everyone
+            (speaker_ids[phrase["speaker"]] or 0) if phrase.get("speaker") else None,
+            phrase.get("episode"),
+        ]
+
+    sql = BATCH_SEARCH_SQL.format(
+        values=", ".join(values),
+        caption_table=Caption._meta.db_table,
+        episode_table=Caption._meta.get_field("episode").related_model._meta.db_table,
+        speakers_table=Caption.speakers.through._meta.db_table,
+        tsquery_function=TSQUERY_FUNCTIONS[mode],
+    )
+    headline_options = (
+        f"StartSel={HEADLINE_START}, StopSel={HEADLINE_STOP}, HighlightAll=true"
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            [SEARCH_CONFIG, headline_options] + params + [SEARCH_CONFIG, limit],
+        )
+        rows = cursor.fetchall()
+
+    captions = Caption.objects.select_related("episode").prefetch_related("speakers")
+    captions = captions.in_bulk([caption_id for _, caption_id, _, _ in rows])
+    results = [[] for _ in phrases]
+
+    for position, caption_id, rank, headline in rows:
+        # The same caption can match several phrases
+        caption = copy.copy(captions[caption_id])
+        caption.rank = rank
+        caption.headline = headline
+        results[position].append(caption)
+
+    return results
@@ -0,0 +1,127 @@
+"""
+Finds where each section of an episode starts, from the cue phrases
+Matt uses to move the show along (see the notes in models.py):
+
+    intro         from the start of the episode
+    first_part    "last we left off..."
+    break         "...we're gonna go ahead and take a break"
+    second_part   "welcome back"
+"""
+import re
+
+SECTIONS = ("intro", "first_part", "break", "second_part")
+
+# Only lines from the DM count as cues, anyone can say "welcome back"
+GAME_MASTER_NAMES = {"MATT", "MATTHEW"}
+
+# Patterns run against normalized text (see episodes.text)
+FIRST_PART_PATTERN = re.compile(
+    r"\b(?:last (?:time )?we (?:had )?(?:last )?|where we (?:last )?)left off\b"
+)
+BREAK_PATTERN = re.compile(
+    r"\b(?:take|go to|have) (?:a|our)(?: \w+)? break\b|\bbreak time\b"
+)
+WELCOME_BACK_PATTERN = re.compile(r"\bwelcome back\b")
+
+# The game starts within the first hour...
+FIRST_PART_WINDOW = 60 * 60 * 1000
+# ...and goes on for a while before the break
+MIN_FIRST_PART_LENGTH = 45 * 60 * 1000
+
+
+def detect_sections(captions, overrides=None):
+    """
+    `captions` is an iterable of (sequence, start, normalized_text,
+    speaker_names) tuples in episode order, with `start` in milliseconds.
+    `overrides` maps section names to start times in milliseconds, which
+    win over anything detected.
+
+    Makes a single pass and returns {section: first sequence number}
+    for the sections it could place.
+    """
+    overrides = {
+        section: start
+        for section, start in (overrides or {}).items()
+        if start is not None
+    }
+    boundaries = {}
+    overridden = {}
+    first_part = None
+    welcome_back = None
+    looking_for_first_part = True
+    break_candidates = []
+
+    for sequence, start, text, speakers in captions:
+        if "intro" not in boundaries:
+            boundaries["intro"] = sequence
+
+        for section, override_start in overrides.items():
+            if section not in overridden and start >= override_start:
+                overridden[section] = sequence
+
+        if "second_part" in boundaries:
+            # Nothing left to detect, keep going only for the overrides
+            if len(overridden) == len(overrides):
+                break
+            continue
+
+        if not GAME_MASTER_NAMES.intersection(speakers or ()):
+            continue
+
+        if looking_for_first_part:
+            if start <= FIRST_PART_WINDOW:
+                if FIRST_PART_PATTERN.search(text):
+                    first_part = (sequence, start)
+                    looking_for_first_part = False
+                elif welcome_back is None and WELCOME_BACK_PATTERN.search(text):
+                    welcome_back = (sequence, start)
+                continue
+
+            # No "last we left off", settle for the first "welcome back"
+            first_part = welcome_back
+            looking_for_first_part = False
+
+        first_part_start = first_part[1] if first_part else 0
+        if start - first_part_start < MIN_FIRST_PART_LENGTH:
+            continue
+
+        if BREAK_PATTERN.search(text):
+            break_candidates.append(sequence)
+        elif WELCOME_BACK_PATTERN.search(text):
+            boundaries["second_part"] = sequence
+
+    if looking_for_first_part:
+        first_part = welcome_back
+
+    if first_part is not None:
+        boundaries["first_part"] = first_part[0]
+
+    # The last mention before coming back, earlier ones tend to be
+    # "we'll take a break in a second"
+    if break_candidates:
+        boundaries["break"] = break_candidates[-1]
+
+    boundaries.update(overridden)
+    return boundaries
+
+
+def section_ranges(boundaries):
+    """
+    Turns {section: first sequence} into (section, first, last) ranges,
+    `last` being exclusive, or None for the section that runs until the
+    end of the episode.
+    """
+    # Sections starting on the same caption leave only the later one
+    starts = sorted(
+        (sequence, SECTIONS.index(section), section)
+        for section, sequence in boundaries.items()
+        if sequence is not None
+    )
+    ranges = []
+
+    for index, (sequence, _, section) in enumerate(starts):
+        end = starts[index + 1][0] if index + 1 < len(starts) else None
+        if end != sequence:
+            ranges.append((section, sequence, end))
+
+    return ranges
@@ -1,8 +1,12 @@
+import datetime
+
+from django.utils.duration import duration_string
 from rest_framework import serializers
 from episodes.models import (
   Episode,
   CastMember,
   Caption,
+  SpeakerStats,
 )
 
 class EpisodeSerializer(serializers.ModelSerializer):
@@ -26,14 +30,133 @@ class CastMemberSerializer(serializers.ModelSerializer):
     ]
 
 
+class MillisecondsField(serializers.DurationField):
+  """
+  An integer milliseconds column, read and written as a duration
+  ("01:23:45.600000") like when times were stored as intervals.
+  """
+
+  def to_representation(self, value):
+    return super().to_representation(datetime.timedelta(milliseconds=value))
+
+  def to_internal_value(self, value):
+    return super().to_internal_value(value) // datetime.timedelta(milliseconds=1)
+
+
+class CaptionTextField(serializers.CharField):
+  """
+  Caption text on a single line, see `Caption.display_text`.
+  """
+
+  def to_representation(self, value):
+    return Caption.display_text(super().to_representation(value))
+
+
 class CaptionSerializer(serializers.ModelSerializer):
+  duration = serializers.DurationField(read_only=True)
+  start = MillisecondsField(source='start_ms')
+  end = MillisecondsField(source='end_ms')
+  text = CaptionTextField()
+
   class Meta:
     model = Caption
     fields = [
+      'id',
       'episode',
+      'sequence',
       'speakers',
       'duration',
       'start',
       'end',
       'text',
     ]
+
+
+class CaptionSearchResultSerializer(serializers.ModelSerializer):
+  start = MillisecondsField(source='start_ms', read_only=True)
+  end = MillisecondsField(source='end_ms', read_only=True)
+  text = CaptionTextField(read_only=True)
+  rank = serializers.FloatField(read_only=True)
+  headline = CaptionTextField(read_only=True)
+  url = serializers.CharField(read_only=True)
+
+  class Meta:
+    model = Caption
+    fields = [
+      'id',
+      'episode',
+      'speakers',
+      'start',
+      'end',
+      'text',
+      'headline',
+      'rank',
+      'url',
+    ]
+
+
+class SpeakerStatsSerializer(serializers.ModelSerializer):
+  class Meta:
+    model = SpeakerStats
+    fields = [
+      'castmember',
+      'episode',
+      'section',
+      'lines',
+      'words',
+      'duration',
+    ]
+
+
+class SimilarCaptionSerializer(serializers.ModelSerializer):
+  start = MillisecondsField(source='start_ms', read_only=True)
+  end = MillisecondsField(source='end_ms', read_only=True)
+  text = CaptionTextField(read_only=True)
+  score = serializers.FloatField(read_only=True)
+  url = serializers.CharField(read_only=True)
+
+  class Meta:
+    model = Caption
+    fields = [
+      'id',
+      'episode',
+      'speakers',
+      'start',
+      'end',
+      'text',
+      'score',
+      'url',
+    ]
+
+
+def caption_rows(captions):
+  """
+  Read-only fast path for caption lists: plain dictionaries straight
+  from `values()`, with speaker ids aggregated in SQL. Turn them into
+  the same payload as CaptionSerializer with `caption_row_data`.
+  """
+  return captions.prefetch_related(None).values(
+    'id',
+    'episode_id',
+    'sequence',
+    'start_ms',
+    'end_ms',
+    'text',
+  ).annotate(
+    speaker_ids=Caption.speaker_array(),
+  )
+
+
+def caption_row_data(row):
+  return {
+    'id': row['id'],
+    'episode': row['episode_id'],
+    'sequence': row['sequence'],
+    'speakers': row['speaker_ids'] or [],
+    'duration': duration_string(
+      datetime.timedelta(milliseconds=row['end_ms'] - row['start_ms'])
+    ),
+    'start': duration_string(datetime.timedelta(milliseconds=row['start_ms'])),
+    'end': duration_string(datetime.timedelta(milliseconds=row['end_ms'])),
+    'text': Caption.display_text(row['text']),
+  }
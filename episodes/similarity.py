@@ -0,0 +1,199 @@
+"""
+"More lines like this one". Captions are turned into TF-IDF vectors,
+stored as a sparse matrix twice over: by caption (CSR), to read a
+caption's terms, and by term (CSC), to find every caption using a term.
+Scoring a caption against the whole corpus then only touches the
+captions sharing a term with it, with a handful of NumPy operations.
+
+Built offline with `./manage.py build_similarity_index`.
+"""
+import math
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+from episodes.text import normalize_text, strip_speakers
+
+# Terms in more captions than this ("the", "you", "yeah") say little
+# about a line and have the longest posting lists, so they're dropped
+MAX_DOCUMENT_FREQUENCY = 0.05
+# Terms used once can't match anything else
+MIN_DOCUMENT_COUNT = 2
+
+ARRAYS = (
+    "caption_ids",
+    "indptr",
+    "indices",
+    "data",
+    "term_indptr",
+    "term_indices",
+    "term_data",
+)
+
+
+def tokenize(text):
+    return normalize_text(strip_speakers(text)).split()
+
+
+class SimilarityIndex:
+    """
+    `caption_ids` is sorted, and row i of the matrix is the caption
+    `caption_ids[i]`. Rows are L2-normalized, so the dot product of two
+    rows is their cosine similarity.
+    """
+
+    def __init__(self, **arrays):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.caption_ids)
+
+    @classmethod
+    def build(cls, documents):
+        """
+        `documents` is an iterable of (caption_id, text).
+        """
+        caption_ids = []
+        term_counts = []
+        document_counts = Counter()
+
+        for caption_id, text in sorted(documents, key=lambda document: document[0]):
+            counts = Counter(tokenize(text))
+            caption_ids.append(caption_id)
+            term_counts.append(counts)
+            document_counts.update(counts.keys())
+
+        total = len(caption_ids)
+        max_count = MAX_DOCUMENT_FREQUENCY * total
+        idf = {
+            term: math.log(total / count)
+            for term, count in document_counts.items()
+            if MIN_DOCUMENT_COUNT <= count <= max_count
+        }
+        term_ids = {term: index for index, term in enumerate(sorted(idf))}
+
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in term_counts:
+            weights = {
+                term_ids[term]: (1 + math.log(count)) * idf[term]
+                for term, count in counts.items()
+                if term in term_ids
+            }
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for term_id in sorted(weights):
+                indices.append(term_id)
+                data.append(weights[term_id] / norm)
+            indptr.append(len(indices))
+
+        indptr = np.array(indptr, dtype=np.int64)
+        indices = np.array(indices, dtype=np.int32)
+        data = np.array(data, dtype=np.float32)
+
+        # The same matrix, ordered by term
+        rows = np.repeat(np.arange(total, dtype=np.int32), np.diff(indptr))
+        order = np.argsort(indices, kind="stable")
+        term_indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=len(term_ids)), out=term_indptr[1:])
+
+        return cls(
+            caption_ids=np.array(caption_ids, dtype=np.int64),
+            indptr=indptr,
+            indices=indices,
+            data=data,
+            term_indptr=term_indptr,
+            term_indices=rows[order],
+            term_data=data[order],
+        )
+
+    def save(self, path):
+        """
+        Writes the index to `path`, replacing it once the new one is
+        complete.
+        """
+        temporary_path = f"{path}.tmp.npz"
+        np.savez(temporary_path, **{name: getattr(self, name) for name in ARRAYS})
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(**{name: arrays[name] for name in ARRAYS})
+
+    def similar(self, caption_id, k=10):
+        """
+        The `k` captions most similar to `caption_id`, as a list of
+        (caption_id, score), best first. Captions that weren't indexed
+        have no similar ones.
+        """
+        row = np.searchsorted(self.caption_ids, caption_id)
+        if row == len(self.caption_ids) or self.caption_ids[row] != caption_id:
+            return []
+
+        terms = self.indices[self.indptr[row] : self.indptr[row + 1]]
+        weights = self.data[self.indptr[row] : self.indptr[row + 1]]
+        if not len(terms):
+            return []
+
+        # Every caption sharing a term with this one, and how much the
+        # term adds to its score
+        postings = [
+            slice(self.term_indptr[term], self.term_indptr[term + 1]) for term in terms
+        ]
+        candidates = np.concatenate([self.term_indices[posting] for posting in postings])
+        contributions = np.concatenate(
+            [
+                self.term_data[posting] * weight
+                for posting, weight in zip(postings, weights)
+            ]
+        )
+
+        candidates, positions = np.unique(candidates, return_inverse=True)
+        scores = np.bincount(positions, weights=contributions)
+        scores[candidates == row] = 0
+
+        if len(scores) > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+
+        return [
+            (int(self.caption_ids[candidates[index]]), float(scores[index]))
+            for index in top
+        ]
+
+
+def build_index(captions):
+    """
+    Indexes every caption in the `captions` queryset.
+    """
+    return SimilarityIndex.build(
+        captions.order_by().values_list("id", "text").iterator(chunk_size=5000)
+    )
+
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def get_index(path):
+    """
+    The index at `path`, loaded once per process and again whenever
+    the file changes. None if it hasn't been built.
+    """
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _lock:
+        loaded = _loaded.get(path)
+        if loaded is None or loaded[0] != modified:
+            loaded = _loaded[path] = (modified, SimilarityIndex.load(path))
+
+    return loaded[1]
@@ -0,0 +1,249 @@
+"""
+A read-only, columnar copy of the corpus on disk, for analysis that
+would otherwise read whole tables out of Postgres. Every column is a
+NumPy array saved in its own file, one row per caption ordered by
+episode and sequence:
+
+    caption_id.npy   int64
+    episode_id.npy   int32
+    sequence.npy     int32
+    start.npy        int32, milliseconds
+    end.npy          int32, milliseconds
+    section_code.npy int8, index into meta.json's "sections", -1 for none
+    speakers.npy     uint64 (captions x words), bit i of the mask is
+                     meta.json's "speakers"[i]
+    text_offsets.npy int64, caption i is text.bin[offsets[i]:offsets[i + 1]]
+    text.bin         UTF-8 text of every caption, back to back, with
+                     newlines between a caption's lines
+
+Snapshots are memory-mapped when opened, so loading one is instant and
+worker processes reading the same snapshot share the OS page cache.
+"""
+import datetime
+import json
+import os
+import shutil
+from array import array
+
+import numpy as np
+from episodes.sections import SECTIONS
+from episodes.text import normalize_speaker_name
+
+SNAPSHOT_VERSION = 1
+
+COLUMN_DTYPES = {
+    "caption_id": np.int64,
+    "episode_id": np.int32,
+    "sequence": np.int32,
+    "start": np.int32,
+    "end": np.int32,
+    "section_code": np.int8,
+}
+
+
+def write_snapshot(path, rows, speakers, episodes):
+    """
+    Writes a snapshot directory at `path`, replacing any existing one
+    once the new one is complete.
+
+    `rows` are dictionaries with the keys `id`, `episode_id`, `sequence`,
+    `start` and `end` (milliseconds), `section`, `speaker_ids` and `text`,
+    in episode order. `speakers` and `episodes` are lists of dictionaries
+    with at least an `id`, stored as they are in meta.json.
+    """
+    temporary_path = f"{path}.tmp"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+
+    speaker_bits = {speaker["id"]: bit for bit, speaker in enumerate(speakers)}
+    mask_words = max(1, (len(speakers) + 63) // 64)
+    sections = {name: code for code, name in enumerate(SECTIONS)}
+
+    columns = {name: array("q") for name in COLUMN_DTYPES}
+    masks = array("Q")
+    offsets = array("q", [0])
+
+    with open(os.path.join(temporary_path, "text.bin"), "wb") as text_file:
+        for row in rows:
+            columns["caption_id"].append(row["id"])
+            columns["episode_id"].append(row["episode_id"])
+            columns["sequence"].append(-1 if row["sequence"] is None else row["sequence"])
+            columns["start"].append(row["start"])
+            columns["end"].append(row["end"])
+            columns["section_code"].append(sections.get(row["section"], -1))
+
+            mask = [0] * mask_words
+            for speaker_id in row["speaker_ids"] or ():
+                bit = speaker_bits[speaker_id]
+                mask[bit // 64] |= 1 << (bit % 64)
+            masks.extend(mask)
+
+            text = row["text"].encode("utf-8")
+            text_file.write(text)
+            offsets.append(offsets[-1] + len(text))
+
+    for name, values in columns.items():
+        np.save(
+            os.path.join(temporary_path, f"{name}.npy"),
+            np.frombuffer(values, dtype=np.int64).astype(COLUMN_DTYPES[name]),
+        )
+    np.save(
+        os.path.join(temporary_path, "speakers.npy"),
+        np.frombuffer(masks, dtype=np.uint64).reshape(-1, mask_words),
+    )
+    np.save(
+        os.path.join(temporary_path, "text_offsets.npy"),
+        np.frombuffer(offsets, dtype=np.int64),
+    )
+
+    with open(os.path.join(temporary_path, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "version": SNAPSHOT_VERSION,
+                "created": datetime.datetime.now().isoformat(),
+                "captions": len(offsets) - 1,
+                "sections": SECTIONS,
+                "speakers": speakers,
+                "episodes": episodes,
+            },
+            f,
+            indent=2,
+        )
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(temporary_path, path)
+
+
+def build_snapshot(path):
+    """
+    Writes a snapshot of every caption in the database to `path`.
+    """
+    # Imported here so reading snapshots doesn't need Django set up
+    from django.db.models import F
+    from episodes.models import Caption, CastMember, Episode
+
+    rows = (
+        Caption.objects.order_by("episode_id", "sequence")
+        .values(
+            "id",
+            "episode_id",
+            "sequence",
+            "section",
+            "text",
+            start=F("start_ms"),
+            end=F("end_ms"),
+            speaker_ids=Caption.speaker_array(),
+        )
+    )
+
+    write_snapshot(
+        path,
+        rows.iterator(chunk_size=5000),
+        speakers=list(CastMember.objects.order_by("id").values("id", "name")),
+        episodes=list(
+            Episode.objects.order_by("chapter").values("id", "chapter", "title")
+        ),
+    )
+
+
+class Snapshot:
+    """
+    Reads a snapshot written by `write_snapshot`. Columns are exposed as
+    read-only memory-mapped arrays, filters return boolean masks that
+    can be combined with & and |:
+
+        snapshot = Snapshot("snapshot")
+        said = snapshot.speaker("MATT") & snapshot.section("break")
+        durations = snapshot.end[said] - snapshot.start[said]
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+        if self.meta["version"] != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Snapshot version {self.meta['version']} is not supported, "
+                f"rebuild it with build_snapshot"
+            )
+
+        for name in (*COLUMN_DTYPES, "speakers", "text_offsets"):
+            setattr(self, name, self._load(f"{name}.npy"))
+
+        text_path = os.path.join(path, "text.bin")
+        if os.path.getsize(text_path):
+            self.text_blob = np.memmap(text_path, mode="r")
+        else:
+            # Empty files can't be mapped
+            self.text_blob = np.zeros(0, dtype=np.uint8)
+
+        self.speaker_bits = {}
+        self.speaker_names = {}
+        for bit, speaker in enumerate(self.meta["speakers"]):
+            self.speaker_bits[speaker["id"]] = bit
+            # The subtitles spell some names differently, like "LIAM "
+            name = normalize_speaker_name(speaker["name"])
+            self.speaker_names.setdefault(name, []).append(speaker["id"])
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.path, filename), mmap_mode="r")
+
+    def __len__(self):
+        return self.meta["captions"]
+
+    def speaker(self, speaker):
+        """
+        Captions said by `speaker`, a cast member id or name.
+        """
+        if isinstance(speaker, str) and not speaker.isdigit():
+            speaker_ids = self.speaker_names.get(normalize_speaker_name(speaker), [])
+        else:
+            speaker_ids = [int(speaker)]
+
+        mask = np.zeros(len(self), dtype=bool)
+        for speaker_id in speaker_ids:
+            bit = self.speaker_bits.get(speaker_id)
+            if bit is not None:
+                word = self.speakers[:, bit // 64]
+                mask |= (word & np.uint64(1 << (bit % 64))) != 0
+
+        return mask
+
+    def episode(self, *episode_ids):
+        return np.isin(self.episode_id, episode_ids)
+
+    def section(self, name):
+        """
+        Captions in section `name`, or without a section when it's None.
+        """
+        if name is None:
+            return self.section_code == -1
+
+        if name not in self.meta["sections"]:
+            return np.zeros(len(self), dtype=bool)
+
+        return self.section_code == self.meta["sections"].index(name)
+
+    def between(self, start, end):
+        """
+        Captions on screen at any point between `start` and `end`,
+        in milliseconds.
+        """
+        return (self.start < end) & (self.end > start)
+
+    def text(self, index):
+        start, end = self.text_offsets[index], self.text_offsets[index + 1]
+        return bytes(self.text_blob[start:end]).decode("utf-8")
+
+    def texts(self, mask_or_indexes):
+        """
+        Yields the text of the captions in a boolean mask or index array.
+        """
+        indexes = np.asarray(mask_or_indexes)
+        if indexes.dtype == bool:
+            indexes = np.flatnonzero(indexes)
+
+        for index in indexes:
+            yield self.text(index)
@@ -0,0 +1,30 @@
+import os
+
+from episodes.benchmarks import compare, synthetic_corpus
+from episodes.management.commands.import_subtitles import parse_episode_subtitles
+
+
+def test_synthetic_corpus(tmp_path):
+  source = tmp_path / 'source'
+  source.mkdir()
+  (source / 'Curious Beginnings _ Critical Role _ Campaign 2, Episode 1-byva0hOj8CU.en.vtt').write_text('WEBVTT\n')
+  (source / 'Notes.txt').write_text('')
+
+  destination = str(tmp_path / 'corpus')
+  assert synthetic_corpus(str(source), destination, scale=3) == 3
+
+  episodes = parse_episode_subtitles(destination)
+  assert [episode['chapter'] for episode in episodes] == ['1', '1001', '2001']
+  assert len({episode['video_id'] for episode in episodes}) == 3
+  assert all(os.path.islink(os.path.join(destination, episode['filename'])) for episode in episodes)
+
+
+def test_compare():
+  baseline = {'requests': {'list_median_ms': 10, 'list_queries': 2}, 'parse': {'parse_captions_per_second': 1000, 'captions': 5}}
+  results = {'requests': {'list_median_ms': 10.5, 'list_queries': 3}, 'parse': {'parse_captions_per_second': 800, 'captions': 50}}
+
+  assert compare(results, baseline) == [
+    ('requests', 'list_queries', 2, 3),
+    ('parse', 'parse_captions_per_second', 1000, 800),
+  ]
+  assert compare(results, baseline, tolerance=0.5) == [('requests', 'list_queries', 2, 3)]
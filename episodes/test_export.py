@@ -0,0 +1,44 @@
+import csv
+import io
+import json
+
+from episodes.export import EXPORT_COLUMNS, iter_csv, iter_ndjson
+
+ROWS = [
+  {
+    'id': 1,
+    'chapter': 12,
+    'sequence': 0,
+    'start': 1.5,
+    'end': 3.0,
+    'section': 'intro',
+    'speakers': ['LAURA', 'SAM'],
+    'text': 'Oh, no! "Nott"\nthe Brave',
+  },
+  {
+    'id': 2,
+    'chapter': 12,
+    'sequence': 1,
+    'start': 3.0,
+    'end': 4.25,
+    'section': None,
+    'speakers': [],
+    'text': 'Zémnian',
+  },
+]
+
+
+def test_iter_ndjson():
+  lines = list(iter_ndjson(ROWS))
+
+  assert all(line.endswith('\n') for line in lines)
+  assert [json.loads(line) for line in lines] == ROWS
+  assert 'Zémnian' in lines[1]
+
+
+def test_iter_csv():
+  rows = list(csv.reader(io.StringIO(''.join(iter_csv(ROWS)))))
+
+  assert rows[0] == list(EXPORT_COLUMNS)
+  assert rows[1] == ['1', '12', '0', '1.5', '3.0', 'intro', 'LAURA|SAM', 'Oh, no! "Nott"\nthe Brave']
+  assert rows[2] == ['2', '12', '1', '3.0', '4.25', '', '', 'Zémnian']
@@ -0,0 +1,57 @@
+from django.http import HttpResponse
+from django.test import RequestFactory
+from episodes.instrumentation import (
+  Histogram,
+  RequestMetrics,
+  current_metrics,
+  record_query,
+  stats,
+)
+from episodes.middleware import InstrumentationMiddleware
+
+
+def test_record_query():
+  metrics = RequestMetrics()
+  token = current_metrics.set(metrics)
+  try:
+    for number in range(8):
+      record_query(lambda *args: number, f'SELECT {number}', None, False, {})
+  finally:
+    current_metrics.reset(token)
+
+  assert metrics.queries == 8
+  assert len(metrics.slowest_queries) == 5
+  assert metrics.server_timing(0.0123).startswith('db;dur=')
+  assert metrics.server_timing(0.0123).endswith('total;dur=12.3')
+
+
+def test_histogram():
+  histogram = Histogram()
+  for value in (1, 5, 6, 10000):
+    histogram.add(value)
+
+  data = histogram.as_dict()
+  assert data['count'] == 4
+  assert data['max'] == 10000
+  assert data['buckets']['<=5'] == 2
+  assert data['buckets']['<=10'] == 1
+  assert data['buckets']['>5000'] == 1
+
+
+def test_middleware(settings, caplog):
+  settings.INSTRUMENT_REQUESTS = True
+  settings.SLOW_REQUEST_THRESHOLD = 0
+  stats.clear()
+
+  def view(request):
+    middleware.process_view(request, None, (), {})
+    return HttpResponse('{}', content_type='application/json')
+
+  middleware = InstrumentationMiddleware(view)
+  response = middleware(RequestFactory().get('/api/episode/'))
+
+  timing = response['Server-Timing']
+  assert 'db;dur=0.0;desc="0 queries"' in timing
+  assert 'serialize;dur=' in timing
+  assert stats.as_dict()['unresolved']['total']['count'] == 1
+  assert 'Slow request: GET /api/episode/' in caplog.text
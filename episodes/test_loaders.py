@@ -0,0 +1,7 @@
+from episodes.loaders import copy_value
+
+
+def test_copy_value():
+  assert copy_value(None) == r'\N'
+  assert copy_value(12) == '12'
+  assert copy_value('MATT:\tRoll\nfor\\initiative\r') == 'MATT:\\tRoll\\nfor\\\\initiative\\r'
@@ -0,0 +1,108 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from episodes.middleware import CorpusCacheMiddleware
+from episodes.models import CorpusState
+
+UPDATED = datetime.datetime(2021, 5, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+  settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+  cache.set(CorpusState.CACHE_KEY, (1, UPDATED))
+  yield
+  cache.clear()
+
+
+class View:
+  def __init__(self, response=None):
+    self.calls = 0
+    self.response = response
+
+  def __call__(self, request):
+    self.calls += 1
+    return self.response or HttpResponse(
+      f'{{"calls": {self.calls}}}', content_type='application/json'
+    )
+
+
+def test_cache_hit():
+  view = View()
+  middleware = CorpusCacheMiddleware(view)
+  request = RequestFactory().get('/api/episode/?page_size=10')
+
+  first = middleware(request)
+  second = middleware(request)
+
+  assert view.calls == 1
+  assert second.content == first.content == b'{"calls": 1}'
+  assert second['Content-Type'] == 'application/json'
+  assert second['ETag'] == first['ETag']
+  assert second['Last-Modified'] == 'Sat, 01 May 2021 00:00:00 GMT'
+
+  # Another query string is another entry
+  middleware(RequestFactory().get('/api/episode/?page_size=20'))
+  assert view.calls == 2
+
+
+def test_host_is_part_of_the_key(settings):
+  settings.ALLOWED_HOSTS = ['example.com', 'critrole.example.com']
+  view = View()
+  middleware = CorpusCacheMiddleware(view)
+
+  middleware(RequestFactory().get('/api/episode/', HTTP_HOST='example.com'))
+  middleware(RequestFactory().get('/api/episode/', HTTP_HOST='critrole.example.com'))
+  middleware(RequestFactory().get('/api/episode/', HTTP_HOST='example.com', secure=True))
+  assert view.calls == 3
+
+
+def test_bump_invalidates():
+  view = View()
+  middleware = CorpusCacheMiddleware(view)
+  request = RequestFactory().get('/api/episode/')
+
+  etag = middleware(request)['ETag']
+  cache.set(CorpusState.CACHE_KEY, (2, UPDATED + datetime.timedelta(days=1)))
+
+  assert middleware(request)['ETag'] != etag
+  assert view.calls == 2
+
+
+def test_not_modified():
+  view = View()
+  middleware = CorpusCacheMiddleware(view)
+  etag = middleware(RequestFactory().get('/api/episode/'))['ETag']
+
+  response = middleware(RequestFactory().get('/api/episode/', HTTP_IF_NONE_MATCH=etag))
+  assert response.status_code == 304
+
+  response = middleware(RequestFactory().get(
+    '/api/caption/', HTTP_IF_MODIFIED_SINCE='Sun, 02 May 2021 00:00:00 GMT'
+  ))
+  assert response.status_code == 304
+  assert view.calls == 1
+
+
+def test_not_cached():
+  view = View()
+  middleware = CorpusCacheMiddleware(view)
+
+  for request in (
+    RequestFactory().post('/api/episode/'),
+    RequestFactory().get('/admin/'),
+    RequestFactory().get('/api/episode/', HTTP_AUTHORIZATION='Token abc'),
+  ):
+    middleware(request)
+    middleware(request)
+
+  assert view.calls == 6
+
+  streaming = View(StreamingHttpResponse(iter([b'WEBVTT']), content_type='text/vtt'))
+  middleware = CorpusCacheMiddleware(streaming)
+  middleware(RequestFactory().get('/api/episode/1/raw/'))
+  middleware(RequestFactory().get('/api/episode/1/raw/'))
+  assert streaming.calls == 2
@@ -0,0 +1,10 @@
+from episodes.models import RawCaptions
+
+
+def test_raw_captions_round_trip():
+  text = 'WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nMATT: Bienvenue, ça va ✨\n' * 200
+  raw = RawCaptions(compressed=RawCaptions.compress(text))
+
+  assert raw.text == text
+  # Small chunks split multi-byte characters between reads
+  assert ''.join(raw.iter_text(chunk_size=7)) == text
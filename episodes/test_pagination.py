@@ -0,0 +1,10 @@
+from episodes.models import Episode
+from episodes.pagination import KeysetPagination
+
+
+def test_seek_filter_is_a_row_comparison():
+  episodes = Episode.objects.filter(KeysetPagination.seek_filter(('chapter', 'id'), [12, 40]))
+  sql = str(episodes.query)
+
+  assert '("episodes_episode"."chapter", "episodes_episode"."id") > (12, 40)' in sql
+  assert ' OR ' not in sql
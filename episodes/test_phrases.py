@@ -0,0 +1,29 @@
+from episodes.phrases import count_phrases, iter_phrases
+
+
+def test_iter_phrases():
+  assert list(iter_phrases(['roll', 'for', 'initiative'], 2)) == [
+    (1, 'roll'),
+    (1, 'for'),
+    (1, 'initiative'),
+    (2, 'roll for'),
+    (2, 'for initiative'),
+  ]
+
+
+def test_count_phrases():
+  counts = count_phrases([
+    ('MATT: Roll for', [1]),
+    ('initiative.', [1]),
+    ('LAURA and SAM: Oh no!', [2, 3]),
+    ('MATT: Roll for initiative!', [1]),
+    ('stage directions', []),
+  ])
+
+  assert counts[1, 3, 'roll for initiative'] == 1
+  assert counts[1, 2, 'for initiative'] == 1
+  assert counts[1, 1, 'roll'] == 2
+  assert counts[2, 2, 'oh no'] == counts[3, 2, 'oh no'] == 1
+  assert counts[1, 2, 'initiative roll'] == 0
+  assert counts[1, 1, 'matt'] == 0
+  assert not any(phrase == 'stage directions' for _, _, phrase in counts)
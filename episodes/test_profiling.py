@@ -0,0 +1,19 @@
+import time
+
+from episodes.profiling import PhaseTimer
+
+
+def slow_items():
+  for item in range(3):
+    time.sleep(0.01)
+    yield item
+
+
+def test_timed_is_not_counted_in_the_consuming_phase():
+  timer = PhaseTimer()
+  with timer.phase('consume'):
+    assert list(timer.timed('produce', slow_items(), 'items')) == [0, 1, 2]
+
+  assert timer.timings['produce'] >= 0.03
+  assert timer.timings['consume'] < timer.timings['produce']
+  assert timer.counters == {'items': 3}
@@ -0,0 +1,41 @@
+from episodes.sections import detect_sections, section_ranges
+
+MINUTE = 60 * 1000
+
+CAPTIONS = [
+  (0, 0, 'matt hello everyone and welcome to tonights episode', ['MATT']),
+  (1, 5 * MINUTE, 'sam welcome back laura', ['SAM']),
+  (2, 9 * MINUTE, 'matt and welcome back so last we left off the mighty nein', ['MATT']),
+  (3, 60 * MINUTE, 'matt well take a break in a second', ['MATT']),
+  (4, 90 * MINUTE, 'matt and thats where were going to take a break', ['MATT']),
+  (5, 110 * MINUTE, 'matt welcome back everyone', ['MATT']),
+  (6, 180 * MINUTE, 'matt is it thursday my dudes', ['MATT']),
+]
+
+
+def test_detect_sections():
+  assert detect_sections(CAPTIONS) == {
+    'intro': 0,
+    'first_part': 2,
+    'break': 4,
+    'second_part': 5,
+  }
+
+
+def test_detect_sections_overrides():
+  assert detect_sections(CAPTIONS, {'break': 60 * MINUTE, 'second_part': None}) == {
+    'intro': 0,
+    'first_part': 2,
+    'break': 3,
+    'second_part': 5,
+  }
+
+
+def test_section_ranges():
+  assert section_ranges({'intro': 0, 'first_part': 2, 'break': 4, 'second_part': 5}) == [
+    ('intro', 0, 2),
+    ('first_part', 2, 4),
+    ('break', 4, 5),
+    ('second_part', 5, None),
+  ]
+  assert section_ranges({'intro': 0, 'first_part': 0}) == [('first_part', 0, None)]
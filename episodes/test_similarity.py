@@ -0,0 +1,24 @@
+from episodes.similarity import SimilarityIndex
+
+DOCUMENTS = [
+  (3, 'MATT: Roll for initiative.'),
+  (1, 'LIAM: Is it Thursday, my dudes?'),
+  (2, 'SAM: Thursday again, my dudes.'),
+  (4, 'TRAVIS: Roll it!'),
+  (5, 'MARISHA: Initiative, everyone.'),
+] + [(id, f'filler line {id}') for id in range(6, 60)]
+
+
+def test_similar(tmp_path):
+  index = SimilarityIndex.build(DOCUMENTS)
+  path = str(tmp_path / 'similarity.npz')
+  index.save(path)
+  index = SimilarityIndex.load(path)
+
+  similar = index.similar(1, k=3)
+  assert [caption_id for caption_id, _ in similar] == [2, 4]  # "thursday my dudes", "it"
+  assert 1 >= similar[0][1] > similar[1][1] > 0
+
+  assert [caption_id for caption_id, _ in index.similar(3, k=1)] in ([4], [5])
+  assert {caption_id for caption_id, _ in index.similar(3, k=5)} == {4, 5}
+  assert index.similar(1000) == []
@@ -0,0 +1,59 @@
+from episodes.snapshot import Snapshot, write_snapshot
+
+SPEAKERS = [{'id': 1, 'name': 'MATT'}, {'id': 2, 'name': 'LIAM'}, {'id': 3, 'name': 'LIAM '}]
+SPEAKERS += [{'id': id, 'name': f'GUEST {id}'} for id in range(4, 80)]
+
+
+def row(id, episode_id, start, end, section, speaker_ids, text):
+  return {
+    'id': id,
+    'episode_id': episode_id,
+    'sequence': id,
+    'start': start,
+    'end': end,
+    'section': section,
+    'speaker_ids': speaker_ids,
+    'text': text,
+  }
+
+
+ROWS = [
+  row(1, 1, 0, 1000, 'intro', [1], 'MATT: Hello everyone.'),
+  row(2, 1, 1000, 2000, None, [2], 'LIAM: Schmidt!'),
+  row(3, 1, 5000, 6000, 'break', [1, 3], 'MATT and LIAM: ¡Olé!'),
+  row(4, 2, 0, 1000, 'intro', [79], 'GUEST 79: Hi.'),
+]
+
+
+def test_snapshot(tmp_path):
+  path = str(tmp_path / 'snapshot')
+  write_snapshot(path, iter(ROWS), SPEAKERS, [{'id': 1, 'chapter': 1}])
+  snapshot = Snapshot(path)
+
+  assert len(snapshot) == 4
+  assert list(snapshot.caption_id) == [1, 2, 3, 4]
+  assert snapshot.speakers.shape == (4, 2)
+
+  assert list(snapshot.speaker('MATT')) == [True, False, True, False]
+  assert list(snapshot.speaker('liam')) == [False, True, True, False]
+  assert list(snapshot.speaker(79)) == [False, False, False, True]
+  assert not snapshot.speaker('NOBODY').any()
+
+  assert list(snapshot.section('intro')) == [True, False, False, True]
+  assert list(snapshot.section(None)) == [False, True, False, False]
+  assert list(snapshot.episode(1) & snapshot.between(500, 5500)) == [True, True, True, False]
+
+  assert snapshot.text(2) == 'MATT and LIAM: ¡Olé!'
+  assert list(snapshot.texts(snapshot.speaker('MATT'))) == [
+    'MATT: Hello everyone.',
+    'MATT and LIAM: ¡Olé!',
+  ]
+
+
+def test_empty_snapshot(tmp_path):
+  path = str(tmp_path / 'snapshot')
+  write_snapshot(path, iter([]), SPEAKERS, [])
+  snapshot = Snapshot(path)
+
+  assert len(snapshot) == 0
+  assert not snapshot.speaker('MATT').any()
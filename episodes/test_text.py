@@ -0,0 +1,21 @@
+from episodes.text import normalize_speaker_name, normalize_text, strip_speakers
+
+def test_normalize_text():
+  assert normalize_text("Don't you dare go hollow!") == 'dont you dare go hollow'
+  assert normalize_text('Dungeons &amp; Dragons') == 'dungeons dragons'
+  assert normalize_text('(laughs)   Is it Thursday, my dudes?') == 'laughs is it thursday my dudes'
+  assert normalize_text('well...yes') == 'well yes'
+  assert normalize_text('') == ''
+
+
+def test_strip_speakers():
+  assert strip_speakers('LAURA and SAM: Oh no!') == 'Oh no!'
+  assert strip_speakers('TRAVIS (V.O.): Hello.') == 'Hello.'
+  assert strip_speakers('Not a speaker: here') == 'Not a speaker: here'
+
+
+def test_normalize_speaker_name():
+  assert normalize_speaker_name('MATT') == 'MATT'
+  assert normalize_speaker_name('Matt (V.O.)') == 'MATT'
+  assert normalize_speaker_name(' LIAM  ') == 'LIAM'
+  assert normalize_speaker_name('SCARY VOICE OVER') == 'SCARY VOICE OVER'
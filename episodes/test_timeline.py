@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from episodes import timeline
+from episodes.models import CorpusState
+from episodes.timeline import Timeline, TimelineCache
+
+
+def row(id, start, end):
+  return {
+    'id': id,
+    'sequence': id,
+    'start_ms': start,
+    'end_ms': end,
+    'text': f'caption {id}',
+    'speaker_ids': [1],
+  }
+
+
+TIMELINE = Timeline(1, [
+  row(0, 0, 60000),  # a long one, overlapping the next few
+  row(1, 1000, 2000),
+  row(2, 1000, 2500),
+  row(3, 3000, 4000),
+  row(4, 70000, 71000),
+])
+
+
+def test_at():
+  assert TIMELINE.at(500) == [0]
+  assert TIMELINE.at(1000) == [0, 1, 2]
+  assert TIMELINE.at(2000) == [0, 2]
+  assert TIMELINE.at(60000) == []
+  assert TIMELINE.at(70500) == [4]
+  assert TIMELINE.at(90000) == []
+
+
+def test_between():
+  assert TIMELINE.between(2100, 3500) == [0, 2, 3]
+  assert TIMELINE.between(61000, 70000) == []
+  assert TIMELINE.between(61000, 70001) == [4]
+
+
+def test_row():
+  assert TIMELINE.row(3) == {
+    'id': 3,
+    'episode_id': 1,
+    'sequence': 3,
+    'speaker_ids': [1],
+    'start_ms': 3000,
+    'end_ms': 4000,
+    'text': 'caption 3',
+  }
+
+
+def test_cache_reloads_on_bump(settings, monkeypatch):
+  settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+  loads = []
+  monkeypatch.setattr(timeline, 'load_timeline', lambda episode_id: loads.append(episode_id) or TIMELINE)
+  timelines = TimelineCache(size=2, timeout=300)
+
+  cache.set(CorpusState.CACHE_KEY, (1, None))
+  timelines.get(1)
+  timelines.get(1)
+  assert loads == [1]
+
+  # Re-importing bumps the generation
+  cache.set(CorpusState.CACHE_KEY, (2, None))
+  timelines.get(1)
+  assert loads == [1, 1]
+  cache.clear()
@@ -0,0 +1,23 @@
+import pytest
+from rest_framework.exceptions import ValidationError
+
+from episodes.views import get_batch_phrases
+
+
+def test_batch_phrases_defaults():
+  assert get_batch_phrases({'phrases': ['my dudes', {'q': 'hi', 'episode': '3'}], 'speaker': 7}) == [
+    {'q': 'my dudes', 'speaker': '7', 'episode': None},
+    {'q': 'hi', 'speaker': '7', 'episode': 3},
+  ]
+
+
+@pytest.mark.parametrize('data', [
+  ['my dudes'],
+  {'phrases': []},
+  {'phrases': ['my dudes'], 'episode': 2 ** 31},
+  {'phrases': ['my dudes'], 'speaker': str(2 ** 31)},
+  {'phrases': [{'q': 'my dudes', 'episode': '²'}]},
+])
+def test_batch_phrases_invalid(data):
+  with pytest.raises(ValidationError):
+    get_batch_phrases(data)
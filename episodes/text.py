@@ -0,0 +1,43 @@
+import html
+import re
+
+APOSTROPHE_PATTERN = re.compile(r"['’]")
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# "MATT:", "LAURA and SAM:", "TRAVIS (V.O.):" at the start of a caption
+SPEAKERS_PATTERN = re.compile(r"^[A-Z][A-Z().,' ]*(?:and [A-Z]+)?:")
+VOICE_OVER_PATTERN = re.compile(r"\s*\(V\.?O\.?\)", re.IGNORECASE)
+
+
+def normalize_text(text):
+    """
+    Lowercases `text`, decodes HTML entities left in by the auto
+    captions ("Dungeons &amp; Dragons") and strips punctuation, so
+    half-remembered quotes can be compared against it:
+
+        "Don't you dare go hollow!" -> "dont you dare go hollow"
+    """
+    text = html.unescape(text).lower()
+    text = APOSTROPHE_PATTERN.sub("", text)
+    text = PUNCTUATION_PATTERN.sub(" ", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def strip_speakers(text):
+    """
+    Removes the speaker names captions start with:
+
+        "LAURA and SAM: Oh no!" -> "Oh no!"
+    """
+    return SPEAKERS_PATTERN.sub("", text, count=1).lstrip()
+
+
+def normalize_speaker_name(name):
+    """
+    The key speaker names are looked up by in `CastMemberAlias`:
+    uppercase, without voice-over marks or extra whitespace.
+
+        " Matt (V.O.)" -> "MATT"
+    """
+    name = VOICE_OVER_PATTERN.sub("", name)
+    return WHITESPACE_PATTERN.sub(" ", name).strip().upper()
@@ -0,0 +1,170 @@
+"""
+"What is being said at 01:23:45?" lookups. Each episode's captions are
+loaded once into arrays sorted by start time, in integer milliseconds,
+and kept in a small process-level cache, so a lookup is a couple of
+binary searches and doesn't touch the database.
+"""
+import bisect
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import Http404
+from episodes.models import Caption, CorpusState, Episode
+from episodes.serializers import caption_rows
+
+
+class Timeline:
+    """
+    An episode's captions sorted by start. Captions overlap, so
+    `max_ends[i]` holds the latest end among the first i + 1 captions:
+    it never decreases, which lets a binary search skip every caption
+    that ended before the time we're looking for.
+    """
+
+    def __init__(self, episode_id, rows):
+        """
+        `rows` are `caption_rows` dictionaries, ordered by start.
+        """
+        self.episode_id = episode_id
+        self.ids = array("q")
+        self.sequences = array("q")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.max_ends = array("q")
+        self.texts = []
+        self.speaker_ids = []
+
+        max_end = 0
+        for row in rows:
+            end = row["end_ms"]
+            max_end = max(max_end, end)
+            self.ids.append(row["id"])
+            self.sequences.append(-1 if row["sequence"] is None else row["sequence"])
+            self.starts.append(row["start_ms"])
+            self.ends.append(end)
+            self.max_ends.append(max_end)
+            self.texts.append(row["text"])
+            self.speaker_ids.append(tuple(row["speaker_ids"] or ()))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def between(self, start, end):
+        """
+        Indexes of the captions on screen at any point in [start, end),
+        in milliseconds. An empty range is the single instant `start`.
+        """
+        first = bisect.bisect_right(self.max_ends, start)
+        if end > start:
+            last = bisect.bisect_left(self.starts, end, first)
+        else:
+            last = bisect.bisect_right(self.starts, start, first)
+
+        return [index for index in range(first, last) if self.ends[index] > start]
+
+    def at(self, position):
+        """
+        Indexes of the captions on screen at `position`, in milliseconds.
+        """
+        return self.between(position, position)
+
+    def row(self, index):
+        """
+        The caption at `index`, in the same shape as `caption_rows`.
+        """
+        return {
+            "id": self.ids[index],
+            "episode_id": self.episode_id,
+            "sequence": None if self.sequences[index] < 0 else self.sequences[index],
+            "speaker_ids": list(self.speaker_ids[index]),
+            "start_ms": self.starts[index],
+            "end_ms": self.ends[index],
+            "text": self.texts[index],
+        }
+
+
+def load_timeline(episode_id):
+    rows = caption_rows(Caption.objects.filter(episode_id=episode_id)).order_by(
+        "start_ms", "id"
+    )
+    timeline = Timeline(episode_id, rows.iterator())
+
+    if not timeline and not Episode.objects.filter(pk=episode_id).exists():
+        raise Http404("No Episode matches the given query.")
+
+    return timeline
+
+
+class TimelineCache:
+    """
+    Least recently used timelines, up to `size` episodes. Entries are
+    reloaded when the corpus generation changes (see `CorpusState`), so
+    a re-imported episode never serves its old captions, and after
+    `timeout` seconds in any case.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, episode_id):
+        now = time.monotonic()
+        generation, _ = CorpusState.current()
+
+        with self.lock:
+            entry = self.entries.get(episode_id)
+            if (
+                entry is not None
+                and entry[1] == generation
+                and now - entry[0] < self.timeout
+            ):
+                self.entries.move_to_end(episode_id)
+                return entry[2]
+
+        timeline = load_timeline(episode_id)
+
+        with self.lock:
+            self.entries[episode_id] = (now, generation, timeline)
+            self.entries.move_to_end(episode_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+        return timeline
+
+    def clear(self, episode_id=None):
+        with self.lock:
+            if episode_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(episode_id, None)
+
+
+cache = TimelineCache(settings.TIMELINE_CACHE_SIZE, settings.TIMELINE_CACHE_TIMEOUT)
+
+
+def captions_between(episode_id, start, end):
+    """
+    `caption_rows` dictionaries for the captions on screen in
+    [start, end), in milliseconds, ordered by start.
+    """
+    if cache.size:
+        timeline = cache.get(episode_id)
+        return [timeline.row(index) for index in timeline.between(start, end)]
+
+    # Without the cache, the (episode, start_ms, id) index bounds the scan
+    captions = Caption.objects.filter(episode_id=episode_id, end_ms__gt=start)
+    if end > start:
+        captions = captions.filter(start_ms__lt=end)
+    else:
+        captions = captions.filter(start_ms__lte=start)
+
+    rows = list(caption_rows(captions).order_by("start_ms", "id"))
+    if not rows and not Episode.objects.filter(pk=episode_id).exists():
+        raise Http404("No Episode matches the given query.")
+
+    return rows
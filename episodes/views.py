@@ -1,25 +1,529 @@
+import contextlib
+import datetime
+
+from django.conf import settings
+from django.db import DataError, ProgrammingError, transaction
+from django.db.models import F, Sum
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.duration import duration_string
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from episodes.export import (
+  EXPORT_CONTENT_TYPES,
+  EXPORT_FORMATS,
+  export_captions,
+)
+from episodes.instrumentation import stats as request_stats
 from episodes.models import (
   Episode,
   CastMember,
+  CastMemberAlias,
   Caption,
+  CorpusState,
+  PhraseCount,
+  RawCaptions,
+  SpeakerStats,
+)
+from episodes.phrases import MAX_PHRASE_LENGTH
+from episodes.search import (
+  DEFAULT_FUZZY_THRESHOLD,
+  DEFAULT_SEARCH_MODE,
+  FULL_TEXT_MODES,
+  SEARCH_MODES,
+  batch_search,
+  filter_captions,
+  search_captions,
 )
 from episodes.serializers import (
+  caption_row_data,
+  caption_rows,
+  CaptionSearchResultSerializer,
   CaptionSerializer,
   CastMemberSerializer,
   EpisodeSerializer,
+  SimilarCaptionSerializer,
+  SpeakerStatsSerializer,
 )
+from episodes.similarity import get_index
+from episodes.text import normalize_text
+from episodes.timeline import captions_between
+
+SEARCH_RESULTS_DEFAULT_LIMIT = 20
+SEARCH_RESULTS_MAX_LIMIT = 100
+BATCH_SEARCH_MAX_PHRASES = 100
+BATCH_SEARCH_DEFAULT_LIMIT = 5
+CONTEXT_DEFAULT_LINES = 5
+CONTEXT_MAX_LINES = 50
+SIMILAR_DEFAULT_LIMIT = 10
+SIMILAR_MAX_LIMIT = 50
+CATCHPHRASES_DEFAULT_LENGTH = 3
+CATCHPHRASES_DEFAULT_LIMIT = 20
+CATCHPHRASES_MAX_LIMIT = 100
+# Ids are integer columns, larger numbers are rejected before Postgres does
+MAX_ID = 2 ** 31 - 1
+
+
+def stats_response(stats):
+  """
+  Pre-aggregated rows from SpeakerStats, plus their totals.
+  """
+  totals = stats.aggregate(lines=Sum('lines'), words=Sum('words'), duration=Sum('duration'))
+  return Response({
+    'totals': {
+      'lines': totals['lines'] or 0,
+      'words': totals['words'] or 0,
+      'duration': duration_string(totals['duration'] or datetime.timedelta()),
+    },
+    'results': SpeakerStatsSerializer(stats, many=True).data,
+  })
+
+
+def get_milliseconds(request, name):
+  """
+  A query parameter in seconds, like 5025.3, as integer milliseconds.
+  """
+  try:
+    seconds = float(request.query_params[name])
+  except KeyError:
+    raise ValidationError({name: 'This parameter is required.'})
+  except ValueError:
+    raise ValidationError({name: 'Must be a number of seconds.'})
+  if not 0 <= seconds < float('inf'):
+    raise ValidationError({name: 'Must be a positive number of seconds.'})
+  return round(seconds * 1000)
+
+
+def is_id(value):
+  value = str(value)
+  return value.isdecimal() and int(value) <= MAX_ID
+
+
+def get_episode_id(request):
+  episode = request.query_params.get('episode')
+  if not episode:
+    return None
+  if not is_id(episode):
+    raise ValidationError({'episode': 'Must be an episode id.'})
+  return int(episode)
+
+
+@contextlib.contextmanager
+def raw_query_errors(mode, name='q'):
+  """
+  Raw mode queries are tsquery syntax, which Postgres only checks when
+  running them: syntax errors become a 400 instead of a 500. The
+  savepoint keeps the connection usable afterwards.
+  """
+  try:
+    with transaction.atomic():
+      yield
+  except (DataError, ProgrammingError):
+    if mode != 'raw':
+      raise
+    raise ValidationError({name: 'Invalid tsquery syntax.'})
+
+
+def get_limit(request, default, maximum, name='limit', minimum=1):
+  limit = request.query_params.get(name, default)
+  try:
+    limit = int(limit)
+  except ValueError:
+    raise ValidationError({name: 'Must be an integer.'})
+  return max(minimum, min(limit, maximum))
+
+
+def get_batch_phrases(data):
+  """
+  The phrases of a batch search request body, each one a string or an
+  object with a `q` and its own `speaker` and `episode`, which default
+  to the body's.
+  """
+  if not isinstance(data, dict):
+    raise ValidationError('Must be a JSON object.')
+
+  phrases = data.get('phrases')
+  if not isinstance(phrases, list) or not phrases:
+    raise ValidationError({'phrases': 'Must be a non-empty list.'})
+  if len(phrases) > BATCH_SEARCH_MAX_PHRASES:
+    raise ValidationError(
+      {'phrases': f'Ensure there are no more than {BATCH_SEARCH_MAX_PHRASES} phrases.'}
+    )
+
+  defaults = {'speaker': data.get('speaker'), 'episode': data.get('episode')}
+  results = []
+  for index, phrase in enumerate(phrases):
+    if isinstance(phrase, str):
+      phrase = {'q': phrase}
+    if not isinstance(phrase, dict) or not str(phrase.get('q') or '').strip():
+      raise ValidationError({'phrases': f'Phrase {index} has no query.'})
+
+    phrase = {**defaults, **phrase, 'q': str(phrase['q']).strip()}
+    if phrase['episode'] is not None and not is_id(phrase['episode']):
+      raise ValidationError({'phrases': f'Phrase {index} has an invalid episode.'})
+    if phrase['speaker'] is not None:
+      phrase['speaker'] = str(phrase['speaker'])
+      # All-digit speakers are cast member ids
+      if phrase['speaker'].isdigit() and not is_id(phrase['speaker']):
+        raise ValidationError({'phrases': f'Phrase {index} has an invalid speaker.'})
+    results.append({
+      'q': phrase['q'],
+      'speaker': phrase['speaker'],
+      'episode': None if phrase['episode'] is None else int(phrase['episode']),
+    })
+
+  return results
 
-class EpisodeViewSet(viewsets.ModelViewSet):
+
+class CorpusViewSet(viewsets.ModelViewSet):
+  """
+  Writes through the API change the corpus, so they invalidate every
+  cached response like an import does.
+  """
+
+  def perform_create(self, serializer):
+    super().perform_create(serializer)
+    CorpusState.bump()
+
+  def perform_update(self, serializer):
+    super().perform_update(serializer)
+    CorpusState.bump()
+
+  def perform_destroy(self, instance):
+    super().perform_destroy(instance)
+    CorpusState.bump()
+
+
+class EpisodeViewSet(CorpusViewSet):
   queryset = Episode.objects.all()
   serializer_class = EpisodeSerializer
+  keyset_ordering = ('chapter', 'id')
+
+  @action(detail=True)
+  def raw(self, request, pk=None):
+    """
+    /api/episode/{id}/raw/
+
+    The episode's original subtitle file, decompressed as it's sent.
+    """
+    raw = get_object_or_404(RawCaptions, episode=self.get_object())
+    return StreamingHttpResponse(
+      raw.iter_text(), content_type='text/vtt; charset=utf-8'
+    )
+
+  @action(detail=True)
+  def stats(self, request, pk=None):
+    """
+    /api/episode/{id}/stats/
+
+    Lines, words and talk time per cast member and section.
+    """
+    episode = self.get_object()
+    return stats_response(
+      SpeakerStats.objects.filter(episode=episode).order_by('castmember_id', 'section')
+    )
+
 
+  @action(detail=True)
+  def at(self, request, pk=None):
+    """
+    /api/episode/{id}/at/?t=5025.3
+    /api/episode/{id}/at/?from=5020&to=5030
 
-class CastMemberViewSet(viewsets.ModelViewSet):
+    The captions on screen at `t`, or at any point between `from` and
+    `to`, in seconds. Served from an in-memory index (see timeline.py).
+    """
+    try:
+      episode_id = int(pk)
+    except ValueError:
+      raise Http404('No Episode matches the given query.')
+
+    if 't' in request.query_params:
+      start = end = get_milliseconds(request, 't')
+    else:
+      start = get_milliseconds(request, 'from')
+      end = get_milliseconds(request, 'to')
+      if end < start:
+        raise ValidationError({'to': 'Must not be before `from`.'})
+
+    rows = captions_between(episode_id, start, end)
+    return Response([caption_row_data(row) for row in rows])
+
+
+class CastMemberViewSet(CorpusViewSet):
   queryset = CastMember.objects.all()
   serializer_class = CastMemberSerializer
+  keyset_ordering = ('id',)
+
+  @action(detail=True)
+  def stats(self, request, pk=None):
+    """
+    /api/castmember/{id}/stats/
 
+    Lines, words and talk time per episode and section.
+    """
+    castmember = self.get_object()
+    return stats_response(
+      SpeakerStats.objects.filter(castmember=castmember).order_by('episode_id', 'section')
+    )
 
-class CaptionViewSet(viewsets.ModelViewSet):
-  queryset = Caption.objects.all()
+  @action(detail=True)
+  def catchphrases(self, request, pk=None):
+    """
+    /api/castmember/{id}/catchphrases/?length=3&limit=20
+
+    The phrases of `length` words (1 to 4) this cast member says the most.
+    """
+    castmember = self.get_object()
+    length = get_limit(request, CATCHPHRASES_DEFAULT_LENGTH, MAX_PHRASE_LENGTH, 'length')
+    phrases = PhraseCount.objects.filter(
+      castmember=castmember,
+      episode__isnull=True,
+      length=length,
+    ).order_by('-count').values('phrase', 'count')
+
+    return Response(list(
+      phrases[:get_limit(request, CATCHPHRASES_DEFAULT_LIMIT, CATCHPHRASES_MAX_LIMIT)]
+    ))
+
+
+class CaptionViewSet(CorpusViewSet):
+  """
+  /api/caption/?episode=3&speaker=LAURA&section=break&page_size=500
+  """
+  queryset = Caption.objects.prefetch_related('speakers')
   serializer_class = CaptionSerializer
+  keyset_ordering = ('episode_id', 'start_ms', 'id')
+
+  def get_queryset(self):
+    return filter_captions(
+      super().get_queryset(),
+      speaker=self.request.query_params.get('speaker'),
+      episode=get_episode_id(self.request),
+      section=self.request.query_params.get('section'),
+    )
+
+  def list(self, request, *args, **kwargs):
+    """
+    Skips CaptionSerializer, see `caption_rows`.
+    """
+    rows = caption_rows(self.filter_queryset(self.get_queryset()))
+
+    page = self.paginate_queryset(rows)
+    if page is None:
+      return Response([caption_row_data(row) for row in rows])
+
+    return self.get_paginated_response([caption_row_data(row) for row in page])
+
+  @action(detail=False)
+  def search(self, request):
+    """
+    /api/caption/search/?q=is it thursday my dudes&speaker=TRAVIS&episode=12
+
+    `mode` is one of plain, phrase, websearch (default), raw or fuzzy.
+    Fuzzy searches also take a `threshold` between 0 and 1.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+      raise ValidationError({'q': 'This parameter is required.'})
+
+    mode = request.query_params.get('mode', DEFAULT_SEARCH_MODE)
+    if mode not in SEARCH_MODES:
+      raise ValidationError({'mode': f'Must be one of: {", ".join(SEARCH_MODES)}.'})
+
+    threshold = request.query_params.get('threshold', DEFAULT_FUZZY_THRESHOLD)
+    try:
+      threshold = float(threshold)
+    except ValueError:
+      raise ValidationError({'threshold': 'Must be a number.'})
+    if not 0 <= threshold <= 1:
+      raise ValidationError({'threshold': 'Must be between 0 and 1.'})
+
+    episode = get_episode_id(request)
+    limit = get_limit(request, SEARCH_RESULTS_DEFAULT_LIMIT, SEARCH_RESULTS_MAX_LIMIT)
+
+    with raw_query_errors(mode):
+      results = search_captions(
+        query,
+        mode=mode,
+        speaker=request.query_params.get('speaker'),
+        episode=episode,
+        limit=limit,
+        threshold=threshold,
+      )
+
+    serializer = CaptionSearchResultSerializer(results, many=True)
+    return Response(serializer.data)
+
+  @action(detail=False, methods=['post'], url_path='batch-search')
+  def batch_search(self, request):
+    """
+    POST /api/caption/batch-search/
+
+      {"phrases": ["my dudes", {"q": "you can certainly try", "speaker": "MATT"}],
+       "speaker": "TRAVIS", "episode": 12, "mode": "phrase", "limit": 5}
+
+    Searches for every phrase with a single query, instead of a request
+    per phrase. `speaker` and `episode` apply to the phrases that don't
+    set their own, `mode` is one of plain, phrase, websearch (default)
+    or raw, and `limit` is per phrase.
+    """
+    phrases = get_batch_phrases(request.data)
+
+    mode = request.data.get('mode', DEFAULT_SEARCH_MODE)
+    if mode not in FULL_TEXT_MODES:
+      raise ValidationError({'mode': f'Must be one of: {", ".join(FULL_TEXT_MODES)}.'})
+
+    limit = request.data.get('limit', BATCH_SEARCH_DEFAULT_LIMIT)
+    try:
+      limit = max(1, min(int(limit), SEARCH_RESULTS_MAX_LIMIT))
+    except (TypeError, ValueError):
+      raise ValidationError({'limit': 'Must be an integer.'})
+
+    with raw_query_errors(mode, 'phrases'):
+      results = batch_search(phrases, mode=mode, limit=limit)
+
+    return Response({
+      'results': [
+        {
+          'q': phrase['q'],
+          'hits': CaptionSearchResultSerializer(hits, many=True).data,
+        }
+        for phrase, hits in zip(phrases, results)
+      ],
+    })
+
+  @action(detail=True)
+  def context(self, request, pk=None):
+    """
+    /api/caption/{id}/context/?before=5&after=5
+
+    The caption and the lines said around it, in order.
+    """
+    caption = self.get_object()
+    if caption.sequence is None:
+      raise NotFound('This caption has no position in its episode.')
+
+    captions = caption.context(
+      before=get_limit(request, CONTEXT_DEFAULT_LINES, CONTEXT_MAX_LINES, 'before', 0),
+      after=get_limit(request, CONTEXT_DEFAULT_LINES, CONTEXT_MAX_LINES, 'after', 0),
+    ).prefetch_related('speakers')
+
+    serializer = self.get_serializer(captions, many=True)
+    return Response(serializer.data)
+
+  @action(detail=True)
+  def similar(self, request, pk=None):
+    """
+    /api/caption/{id}/similar/?k=10
+
+    The `k` lines closest to this one by TF-IDF cosine similarity,
+    from the index built by `./manage.py build_similarity_index`.
+    """
+    caption = self.get_object()
+    index = get_index(settings.SIMILARITY_INDEX_PATH)
+    if index is None:
+      raise NotFound('The similarity index has not been built.')
+
+    scores = dict(index.similar(
+      caption.id, k=get_limit(request, SIMILAR_DEFAULT_LIMIT, SIMILAR_MAX_LIMIT, 'k')
+    ))
+    captions = (
+      Caption.objects.filter(id__in=scores)
+      .select_related('episode')
+      .prefetch_related('speakers')
+    )
+    for similar_caption in captions:
+      similar_caption.score = scores[similar_caption.id]
+
+    serializer = SimilarCaptionSerializer(
+      sorted(captions, key=lambda similar_caption: -similar_caption.score), many=True
+    )
+    return Response(serializer.data)
+
+  @action(detail=False)
+  def export(self, request):
+    """
+    /api/caption/export/?output=csv&gzip=1
+
+    Streams every caption (or the filtered ones, same filters as the
+    list) as NDJSON (default) or CSV, optionally gzipped.
+    """
+    output_format = request.query_params.get('output', 'ndjson')
+    if output_format not in EXPORT_FORMATS:
+      raise ValidationError({'output': f'Must be one of: {", ".join(EXPORT_FORMATS)}.'})
+
+    compress = request.query_params.get('gzip') in ('1', 'true')
+    filename = f'captions.{output_format}' + ('.gz' if compress else '')
+
+    response = StreamingHttpResponse(
+      export_captions(self.get_queryset(), output_format, compress),
+      content_type='application/gzip' if compress else EXPORT_CONTENT_TYPES[output_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class PhraseViewSet(viewsets.ViewSet):
+  """
+  /api/phrase/?q=roll for initiative&speaker=MATT
+
+  How many times a phrase of up to 4 words was said, per cast member and
+  per episode. `speaker` takes a cast member id or name.
+  """
+
+  def list(self, request):
+    phrase = normalize_text(request.query_params.get('q', ''))
+    if not phrase:
+      raise ValidationError({'q': 'This parameter is required.'})
+    if len(phrase.split()) > MAX_PHRASE_LENGTH:
+      raise ValidationError({'q': f'Must be at most {MAX_PHRASE_LENGTH} words.'})
+
+    counts = PhraseCount.objects.filter(phrase=phrase, episode__isnull=False)
+
+    speaker = request.query_params.get('speaker')
+    if speaker:
+      if speaker.isdigit():
+        counts = counts.filter(castmember=speaker)
+      else:
+        counts = counts.filter(castmember__in=CastMemberAlias.castmember_id(speaker))
+
+    speakers = list(
+      counts.values('castmember', name=F('castmember__name'))
+      .annotate(count=Sum('count'))
+      .order_by('-count', 'castmember')
+    )
+    episodes = list(
+      counts.values('episode', chapter=F('episode__chapter'))
+      .annotate(count=Sum('count'))
+      .order_by('chapter')
+    )
+
+    return Response({
+      'phrase': phrase,
+      'total': sum(row['count'] for row in speakers),
+      'speakers': speakers,
+      'episodes': episodes,
+    })
+
+
+class InstrumentationView(APIView):
+  """
+  /api/instrumentation/
+
+  Histograms of request timings (milliseconds) and query counts per view,
+  collected by InstrumentationMiddleware in this process since it started
+  or since the last DELETE. Admins only.
+  """
+  permission_classes = [IsAdminUser]
+
+  def get(self, request):
+    return Response(request_stats.as_dict())
+
+  def delete(self, request):
+    request_stats.clear()
+    return Response(status=204)
@@ -0,0 +1,135 @@
+"""
+A minimal, streaming WebVTT reader for the files youtube-dl downloads.
+
+It reads the file line by line and yields one `Cue` per cue block, so an
+episode never has to be held in memory as a list of caption objects.
+Cue handling follows webvtt-py, which the importer used before: the
+header block, NOTE and STYLE blocks are skipped, and a timing line in
+the middle of a block starts a new cue.
+"""
+import itertools
+import re
+
+TIMING_PATTERN = re.compile(
+    r"\s*((?:\d+:)?\d{2}:\d{2}.\d{3})\s*-->\s*((?:\d+:)?\d{2}:\d{2}.\d{3})"
+)
+TIMESTAMP_PATTERN = re.compile(r"(\d+)?:?(\d{2}):(\d{2})[.,](\d{3})")
+CUE_TAGS_PATTERN = re.compile(r"<.*?>")
+
+
+class MalformedFileError(ValueError):
+    pass
+
+
+class Cue:
+    """
+    A single caption. `start` and `end` are in milliseconds, `lines` is a
+    tuple of the cue's text lines, as they appear in the file.
+    """
+
+    __slots__ = ("start", "end", "lines")
+
+    def __init__(self, start, end, lines):
+        self.start = start
+        self.end = end
+        self.lines = lines
+
+    @property
+    def text(self):
+        """
+        The cue's lines joined by newlines, without cue tags like <c>.
+        """
+        return CUE_TAGS_PATTERN.sub("", "\n".join(self.lines))
+
+    def __eq__(self, other):
+        return isinstance(other, Cue) and (self.start, self.end, self.lines) == (
+            other.start,
+            other.end,
+            other.lines,
+        )
+
+    def __repr__(self):
+        return f"<Cue start={self.start} end={self.end} lines={self.lines!r}>"
+
+
+def parse_timestamp(timestamp):
+    """
+    "01:02:03.456" or "02:03.456" to milliseconds.
+    """
+    match = TIMESTAMP_PATTERN.match(timestamp)
+    if match is None:
+        raise MalformedFileError(f"Invalid timestamp: {timestamp}")
+
+    hours, minutes, seconds, milliseconds = (int(x) if x else 0 for x in match.groups())
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + milliseconds
+
+
+def iter_blocks(lines):
+    """
+    Groups lines into blocks separated by empty lines, skipping the
+    file's header block (the one starting with "WEBVTT").
+    """
+    block = []
+    header_seen = False
+
+    for line in lines:
+        line = line.rstrip("\n\r")
+
+        if line:
+            # Whitespace-only lines can't start a block
+            if block or line.strip():
+                block.append(line)
+            continue
+
+        if block:
+            if header_seen:
+                yield block
+            header_seen = True
+            block = []
+
+    if block and header_seen:
+        yield block
+
+
+def parse_block(block):
+    """
+    Yields the cues in a block. Blocks that aren't cues (comments,
+    styles) yield nothing.
+    """
+    if "-->" not in block[0] and (len(block) < 2 or "-->" not in block[1]):
+        return
+
+    timing = None
+    lines = []
+
+    for index, line in enumerate(block):
+        if "-->" in line:
+            if timing is not None:
+                # A second timing line starts a new cue
+                yield Cue(timing[0], timing[1], tuple(lines))
+                yield from parse_block(block[index:])
+                return
+
+            match = TIMING_PATTERN.match(line)
+            if match is None:
+                raise MalformedFileError(f"Invalid cue timing: {line}")
+            timing = (parse_timestamp(match.group(1)), parse_timestamp(match.group(2)))
+        elif index > 0:
+            # The first line, if it's not the timing, is the cue identifier
+            lines.append(line)
+
+    yield Cue(timing[0], timing[1], tuple(lines))
+
+
+def read_cues(file):
+    """
+    Yields the cues in `file`, an open text file or any iterable of lines.
+    """
+    lines = iter(file)
+    first_line = next(lines, "")
+
+    if not first_line.lstrip("\ufeff").startswith("WEBVTT"):
+        raise MalformedFileError("The file does not have a valid format")
+
+    for block in iter_blocks(itertools.chain([first_line], lines)):
+        yield from parse_block(block)